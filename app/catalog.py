@@ -0,0 +1,193 @@
+# Local mirror of the Sortly catalog (the sortly_cache table).
+# The delta sync upserts every changed item it pages through, item-move
+# webhooks patch the location in between, and POST /sortly/catalog/refresh
+# backfills the whole catalog. Name/SKU search is answered from here; the
+# live Sortly API is only a fallback (see app/sortly_api.py).
+# Callers own the transaction unless noted.
+import os
+from datetime import datetime, timezone
+
+from sqlalchemy import and_, or_
+from sqlalchemy.orm import Session
+
+from app.database import bulk_upsert
+from app.locations import location_tree
+from app.models import SortlyItem
+from app.sortly_pager import ItemPager
+
+# Budget for a full catalog walk (the delta sync has its own, smaller one)
+SORTLY_CATALOG_MAX_ITEMS = int(os.getenv("SORTLY_CATALOG_MAX_ITEMS", "100000"))
+
+# Columns the delta sync and the full refresh both own
+CATALOG_COLUMNS = [
+    "name", "sku", "quantity", "parent_id", "location",
+    "name_key", "sku_key", "last_seen", "sortly_updated_at",
+]
+# What a full refresh may overwrite on rows the delta sync already tracks
+REFRESH_COLUMNS = [c for c in CATALOG_COLUMNS if c != "sortly_updated_at"]
+
+
+def parse_sortly_time(value):
+    """Sortly ISO timestamp -> naive UTC datetime (None if missing/garbled)."""
+    if not value:
+        return None
+    try:
+        parsed = datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+
+def item_parent_id(item):
+    parent = item.get("parent") if isinstance(item.get("parent"), dict) else {}
+    return item.get("parent_id") or parent.get("id")
+
+
+def item_location(item):
+    """Location name: resolved from the cached tree by id, else the nested dicts."""
+    name = location_tree.name(item_parent_id(item))
+    if name:
+        return name
+    if "location" in item and isinstance(item["location"], dict):
+        return item["location"].get("name")
+    if "parent" in item and isinstance(item["parent"], dict):
+        return item["parent"].get("name")
+    return None
+
+
+def _key(value):
+    return value.strip().lower() if value else None
+
+
+def _quantity(value):
+    try:
+        return float(value) if value is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+def item_row(item: dict, updated_at, now) -> dict:
+    """Mirror row for one Sortly item (without last_location)."""
+    name = item.get("name")
+    sku = item.get("sku")
+    return {
+        "sortly_id": item.get("id"),
+        "name": name,
+        "sku": sku,
+        "quantity": _quantity(item.get("quantity")),
+        "parent_id": item_parent_id(item),
+        "location": item_location(item),
+        "name_key": _key(name),
+        "sku_key": _key(sku),
+        "last_seen": now,
+        "sortly_updated_at": updated_at,
+    }
+
+
+def record_move(db: Session, sortly_id, name, location, parent_id=None):
+    """Patch an item's location from a move webhook (no commit)."""
+    if sortly_id is None:
+        return
+    row = {
+        "sortly_id": sortly_id,
+        "name": name,
+        "name_key": _key(name),
+        "location": location,
+        "last_seen": datetime.utcnow(),
+    }
+    if parent_id is not None:
+        row["parent_id"] = parent_id
+    update_cols = [c for c in row if c != "sortly_id"]
+    # A new row starts with last_location = location, like an unknown item in the sync
+    bulk_upsert(db, SortlyItem, [{**row, "last_location": location}],
+                conflict_cols=["sortly_id"], update_cols=update_cols)
+
+
+def refresh(db: Session, max_pages=None, max_items=None, renew=None) -> dict:
+    """
+    Walk the whole Sortly catalog into the mirror, one upsert and commit per
+    page. last_location and sortly_updated_at are only set for new rows:
+    the delta sync skips items whose updated_at it already holds, so
+    leaving both alone means it still sees (and deducts) warehouse exits.
+    `renew(db)`, if given, runs before each page's commit (the sync lease).
+    Returns the pagination report and the mirror size.
+    """
+    max_items = max_items or SORTLY_CATALOG_MAX_ITEMS
+    pager = ItemPager(max_pages=max_pages or max_items // 100 + 1, max_items=max_items)
+    for page in pager.iter_pages():
+        now = datetime.utcnow()
+        rows = {}
+        for item in page:
+            if item.get("type") == "folder" or item.get("id") is None:
+                continue
+            row = item_row(item, parse_sortly_time(item.get("updated_at")), now)
+            rows[row["sortly_id"]] = {**row, "last_location": row["location"]}
+        bulk_upsert(db, SortlyItem, list(rows.values()),
+                    conflict_cols=["sortly_id"], update_cols=REFRESH_COLUMNS)
+        if renew:
+            renew(db)
+        db.commit()
+    return {"pagination": pager.report(), "mirrored": db.query(SortlyItem).count()}
+
+
+def to_sortly(item: SortlyItem) -> dict:
+    """Mirror row in the shape Sortly's /items returns."""
+    return {
+        "id": item.sortly_id,
+        "name": item.name,
+        "sku": item.sku,
+        "quantity": item.quantity,
+        "parent_id": item.parent_id,
+        "parent": {"id": item.parent_id, "name": item.location} if item.location else None,
+        "updated_at": item.sortly_updated_at.isoformat() + "Z" if item.sortly_updated_at else None,
+    }
+
+
+def _like_escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def _prefix(column, key, dialect):
+    if dialect == "postgresql":
+        # Served by the trigram GIN index
+        return column.like(_like_escape(key) + "%", escape="\\")
+    # Byte-order range: a plain b-tree index answers it on any backend
+    return and_(column >= key, column < key + "\uffff")
+
+
+def search(db: Session, query=None, location_id=None, limit=50) -> list[SortlyItem]:
+    """
+    Name/SKU search: prefix matches first, then substring matches, each in
+    name order. With no query, lists the mirror (optionally one location).
+    """
+    base = db.query(SortlyItem)
+    if location_id is not None:
+        base = base.filter(SortlyItem.parent_id == location_id)
+    key = _key(query)
+    if not key:
+        return base.order_by(SortlyItem.name_key, SortlyItem.id).limit(limit).all()
+
+    dialect = db.get_bind().dialect.name
+    found = (
+        base.filter(or_(_prefix(SortlyItem.name_key, key, dialect), _prefix(SortlyItem.sku_key, key, dialect)))
+        .order_by(SortlyItem.name_key, SortlyItem.id)
+        .limit(limit)
+        .all()
+    )
+    if len(found) < limit:
+        pattern = "%" + _like_escape(key) + "%"
+        seen = [item.id for item in found]
+        substring = base.filter(or_(
+            SortlyItem.name_key.like(pattern, escape="\\"),
+            SortlyItem.sku_key.like(pattern, escape="\\"),
+        ))
+        if seen:
+            substring = substring.filter(SortlyItem.id.notin_(seen))
+        found += substring.order_by(SortlyItem.name_key, SortlyItem.id).limit(limit - len(found)).all()
+    return found
+
+
+def is_empty(db: Session) -> bool:
+    return db.query(SortlyItem.id).first() is None
@@ -0,0 +1,74 @@
+import asyncio
+import logging
+from datetime import datetime
+
+from sqlalchemy import select, update
+
+logger = logging.getLogger(__name__)
+
+
+def claim(db, model, key, claimable, order_by, limit: int, worker_id: str, **values) -> list:
+    """
+    Mark up to `limit` rows matching `claimable` as claimed by `worker_id`
+    (plus any extra column `values`) and commit; returns the claimed keys.
+    An idle queue costs one indexed SELECT and no write. The UPDATE
+    re-checks `claimable`, so of two workers racing for a row only one
+    gets it.
+    """
+    due = db.scalars(select(key).where(*claimable).order_by(order_by).limit(limit)).all()
+    if not due:
+        db.rollback()
+        return []
+    db.execute(
+        update(model)
+        .where(key.in_(due), *claimable)
+        .values(claimed_by=worker_id, claimed_at=datetime.utcnow(), **values)
+        .execution_options(synchronize_session=False)
+    )
+    db.commit()
+    return due
+
+
+class ClaimQueue:
+    """
+    Background loop for a DB-backed queue: drain a batch, go straight to the
+    next one while batches come back full, otherwise sleep until the
+    interval passes or notify() wakes it early.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._loop = None
+        self._wakeup = None
+
+    def notify(self):
+        """Wake the worker early (safe to call from any thread)."""
+        if self._loop is not None and self._wakeup is not None:
+            self._loop.call_soon_threadsafe(self._wakeup.set)
+
+    async def run(self, drain, batch_size: int, interval: float, idle=None):
+        """
+        Run `drain() -> rows handled` until cancelled; `idle()`, if given,
+        runs whenever the queue has been emptied. Both run off the event loop.
+        """
+        self._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+
+        while True:
+            try:
+                handled = await asyncio.to_thread(drain)
+            except Exception:
+                logger.exception("queue worker error", extra={"queue": self.name})
+                handled = 0
+
+            if handled >= batch_size:
+                continue  # more waiting; go straight to the next batch
+
+            if idle is not None:
+                await asyncio.to_thread(idle)
+
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=interval)
+            except asyncio.TimeoutError:
+                pass
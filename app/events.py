@@ -0,0 +1,103 @@
+import asyncio
+import json
+import threading
+
+from sqlalchemy import event
+
+from app.database import AppSession
+
+# Per-subscriber buffer; a client this far behind is dropped and must reconnect
+SUBSCRIBER_QUEUE_SIZE = 1000
+
+
+class EventHub:
+    """
+    In-process fan-out for job quantity changes. Each event is serialized to
+    an SSE frame once and the same bytes are handed to every subscriber.
+    publish() is safe to call from routes (async or threadpool) and background threads.
+    Changes committed by another process (a second worker or replica) are not
+    seen here; the dashboard re-reads the job list periodically to cover them.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = set()
+
+    def subscribe(self) -> asyncio.Queue:
+        queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        with self._lock:
+            self._subscribers.add((asyncio.get_running_loop(), queue))
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue):
+        with self._lock:
+            self._subscribers = {s for s in self._subscribers if s[1] is not queue}
+
+    def publish(self, payload: dict):
+        with self._lock:
+            subscribers = list(self._subscribers)
+        if not subscribers:
+            return
+        frame = f"event: {payload['type']}\ndata: {json.dumps(payload)}\n\n"
+        for loop, queue in subscribers:
+            try:
+                loop.call_soon_threadsafe(self._deliver, queue, frame)
+            except RuntimeError:  # subscriber's loop already closed
+                self.unsubscribe(queue)
+
+    def _deliver(self, queue: asyncio.Queue, frame: str):
+        try:
+            queue.put_nowait(frame)
+        except asyncio.QueueFull:
+            # Too far behind: drop it and tell the reader to hang up
+            self.unsubscribe(queue)
+            queue.get_nowait()
+            queue.put_nowait(None)
+
+
+hub = EventHub()
+
+
+# ---------- Session hooks: publish only what actually committed ----------
+def track_qty(db, job_id: int, name: str, qty: int):
+    """Record an item quantity change; it is published when `db` commits."""
+    db.info.setdefault("qty_changes", {})[(job_id, name)] = qty
+
+
+def track_job(db, kind: str, job_id: int):
+    """Record a job-level change ("job_created" / "job_updated" / "job_deleted")."""
+    db.info.setdefault("job_changes", []).append((kind, job_id))
+
+
+def changes_mark(db):
+    return dict(db.info.get("qty_changes", {})), list(db.info.get("job_changes", []))
+
+
+def discard_since(db, mark):
+    """Forget changes recorded after `mark` (e.g. a savepoint that rolled back)."""
+    qty, jobs = mark
+    db.info["qty_changes"] = qty
+    db.info["job_changes"] = jobs
+
+
+@event.listens_for(AppSession, "after_commit")
+def _publish_committed(session):
+    qty_changes = session.info.pop("qty_changes", {})
+    job_changes = session.info.pop("job_changes", [])
+
+    by_job = {}
+    for (job_id, name), qty in qty_changes.items():
+        by_job.setdefault(job_id, []).append({"name": name, "current_qty": qty})
+    for job_id, items in by_job.items():
+        hub.publish({"type": "qty", "job_id": job_id, "items": items})
+    for kind, job_id in job_changes:
+        hub.publish({"type": kind, "job_id": job_id})
+
+
+@event.listens_for(AppSession, "after_transaction_end")
+def _drop_uncommitted(session, transaction):
+    # Outer transaction over without a commit (rollback/close): nothing to publish.
+    # Savepoints are left alone; callers undo those with discard_since().
+    if transaction.parent is None:
+        session.info.pop("qty_changes", None)
+        session.info.pop("job_changes", None)
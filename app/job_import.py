@@ -0,0 +1,153 @@
+import codecs
+import csv
+import io
+import json
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app.database import bulk_upsert
+from app.models import JobItem
+
+# Rows handed to the database per round trip
+IMPORT_CHUNK_ROWS = 1000
+
+NAME_FIELDS = ("name", "sku", "item", "item_name")
+COUNT_FIELDS = ("count", "qty", "quantity", "current_qty")
+
+
+class PickListError(ValueError):
+    """A pick-list line that can't be parsed (message includes the line number)."""
+
+
+def _count(value, line_no):
+    try:
+        count = int(float(value))
+    except (TypeError, ValueError):
+        raise PickListError(f"line {line_no}: invalid count {value!r}")
+    if count < 0:
+        raise PickListError(f"line {line_no}: negative count {count}")
+    return count
+
+
+async def iter_lines(byte_stream):
+    """Yield (line_no, text) from an async byte stream without buffering the body."""
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    pending = ""
+    line_no = 0
+    async for chunk in byte_stream:
+        pending += decoder.decode(chunk)
+        *lines, pending = pending.split("\n")
+        for line in lines:
+            line_no += 1
+            yield line_no, line.rstrip("\r")
+    pending += decoder.decode(b"", final=True)
+    if pending:
+        yield line_no + 1, pending.rstrip("\r")
+
+
+class CsvRows:
+    """`name,count` rows; an optional header row may name the columns."""
+
+    def __init__(self):
+        self.name_col, self.count_col = 0, 1
+        self.first = True
+
+    def parse(self, line_no, line):
+        if not line.strip():
+            return None
+        fields = next(csv.reader([line]))
+        if self.first:
+            self.first = False
+            header = [f.strip().lower() for f in fields]
+            if any(f in NAME_FIELDS for f in header):
+                self.name_col = next(i for i, f in enumerate(header) if f in NAME_FIELDS)
+                self.count_col = next((i for i, f in enumerate(header) if f in COUNT_FIELDS), 1)
+                return None
+        if len(fields) <= max(self.name_col, self.count_col):
+            raise PickListError(f"line {line_no}: expected name and count")
+        name = fields[self.name_col].strip()
+        if not name:
+            raise PickListError(f"line {line_no}: missing name")
+        return name, _count(fields[self.count_col], line_no)
+
+
+class NdjsonRows:
+    """One JSON object per line: {"name": ..., "count": ...}."""
+
+    def parse(self, line_no, line):
+        if not line.strip():
+            return None
+        try:
+            obj = json.loads(line)
+        except ValueError:
+            raise PickListError(f"line {line_no}: invalid JSON")
+        if not isinstance(obj, dict):
+            raise PickListError(f"line {line_no}: expected an object")
+        name = next((obj[f] for f in NAME_FIELDS if obj.get(f)), None)
+        if not name:
+            raise PickListError(f"line {line_no}: missing name")
+        count = next((obj[f] for f in COUNT_FIELDS if f in obj), None)
+        return str(name).strip(), _count(count, line_no)
+
+
+class ItemLoader:
+    """
+    Loads (name, count) chunks into job_items for one job; repeated SKUs are
+    summed. Postgres streams chunks into a temp table with COPY and merges
+    once at the end; other backends upsert each chunk with executemany.
+    Nothing here commits.
+    """
+
+    def __init__(self, db: Session, job_id: int):
+        self.db = db
+        self.job_id = job_id
+        self.rows = 0
+        self.use_copy = db.get_bind().dialect.name == "postgresql"
+        if self.use_copy:
+            db.execute(text(
+                "CREATE TEMP TABLE IF NOT EXISTS job_import_staging "
+                "(name text NOT NULL, qty integer NOT NULL) ON COMMIT DROP"
+            ))
+
+    def load(self, chunk):
+        if not chunk:
+            return
+        self.rows += len(chunk)
+        if self.use_copy:
+            buf = io.StringIO()
+            csv.writer(buf).writerows(chunk)
+            buf.seek(0)
+            cursor = self.db.connection().connection.cursor()
+            try:
+                cursor.copy_expert("COPY job_import_staging (name, qty) FROM STDIN WITH (FORMAT csv)", buf)
+            finally:
+                cursor.close()
+            return
+
+        summed = {}
+        for name, count in chunk:
+            summed[name] = summed.get(name, 0) + count
+        self._upsert([
+            {"job_id": self.job_id, "name": name, "current_qty": count}
+            for name, count in summed.items()
+        ])
+
+    def _upsert(self, rows):
+        bulk_upsert(
+            self.db, JobItem, rows,
+            conflict_cols=["job_id", "name"],
+            set_={"current_qty": lambda excluded: JobItem.current_qty + excluded.current_qty},
+        )
+
+    def finish(self):
+        if self.use_copy:
+            self.db.execute(
+                text(
+                    "INSERT INTO job_items (job_id, name, current_qty) "
+                    "SELECT :job_id, name, SUM(qty) FROM job_import_staging GROUP BY name "
+                    "ON CONFLICT (job_id, name) DO UPDATE "
+                    "SET current_qty = job_items.current_qty + EXCLUDED.current_qty"
+                ),
+                {"job_id": self.job_id},
+            )
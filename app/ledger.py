@@ -0,0 +1,79 @@
+# Quantity ledger: the one place JobItem.current_qty is decremented.
+# Every change is a single UPDATE guarded in its WHERE clause, so concurrent
+# scans, webhooks and syncs on different workers can't lose a decrement.
+# Each decrement also feeds the per-minute pick rollups (app/rollups.py).
+# Callers own the transaction (nothing here commits).
+from sqlalchemy import select, update
+from sqlalchemy.orm import Session
+
+from app.events import track_qty
+from app.models import JobItem
+from app.rollups import record_picks
+
+# Compare-and-set attempts for clamped decrements before giving up
+CAS_RETRIES = 5
+
+
+def decrement(db: Session, job_id: int, name: str, amount: int = 1):
+    """
+    Take `amount` off an item only if it has at least that much left.
+    Returns the new quantity, or None if the item is missing or short.
+    """
+    qty_after = db.execute(
+        update(JobItem)
+        .where(
+            JobItem.job_id == job_id,
+            JobItem.name == name,
+            JobItem.current_qty >= amount,
+        )
+        .values(current_qty=JobItem.current_qty - amount)
+        .returning(JobItem.current_qty)
+    ).scalar_one_or_none()
+    if qty_after is not None:
+        track_qty(db, job_id, name, qty_after)
+        record_picks(db, job_id, name, amount)
+    return qty_after
+
+
+def decrement_clamped(db: Session, job_id: int, name: str, amount: int = 1):
+    """
+    Take up to `amount` off an item, stopping at zero.
+    Returns (qty_before, qty_after), or None if the item doesn't exist.
+    """
+    qty_after = decrement(db, job_id, name, amount)
+    if qty_after is not None:
+        return qty_after + amount, qty_after
+
+    # Not enough left: clamp to zero with compare-and-set on the value we read
+    for _ in range(CAS_RETRIES):
+        before = db.execute(
+            select(JobItem.current_qty).where(JobItem.job_id == job_id, JobItem.name == name)
+        ).scalar_one_or_none()
+        if before is None:
+            return None
+        before = before or 0
+        after = max(0, before - amount)
+        if before == after:
+            return before, after
+        swapped = db.execute(
+            update(JobItem)
+            .where(
+                JobItem.job_id == job_id,
+                JobItem.name == name,
+                JobItem.current_qty == before,
+            )
+            .values(current_qty=after)
+            .returning(JobItem.id)
+        ).scalar_one_or_none()
+        if swapped is not None:
+            track_qty(db, job_id, name, after)
+            record_picks(db, job_id, name, before - after)
+            return before, after
+    raise RuntimeError(f"Could not decrement '{name}' in job {job_id}: too much contention")
+
+
+def get_qty(db: Session, job_id: int, name: str):
+    """Current quantity for one item (None if the job has no such item)."""
+    return db.execute(
+        select(JobItem.current_qty).where(JobItem.job_id == job_id, JobItem.name == name)
+    ).scalar_one_or_none()
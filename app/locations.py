@@ -0,0 +1,155 @@
+import logging
+import os
+import threading
+import time
+
+from app import sortly_client
+from app.sortly_pager import SortlyAPIError
+
+logger = logging.getLogger(__name__)
+
+# Locations change rarely; folder webhooks and /sortly/locations?refresh=true
+# invalidate early
+LOCATION_TREE_TTL_SECONDS = float(os.getenv("LOCATION_TREE_TTL_SECONDS", "300"))
+# After a failed fetch, keep serving the old tree this long before retrying
+LOCATION_TREE_RETRY_SECONDS = 30.0
+# Optional: WAREHOUSE_NAMES="Warehouse,Main Warehouse,WH"
+WAREHOUSE_NAMES = frozenset(
+    x.strip().lower() for x in os.getenv("WAREHOUSE_NAMES", "Warehouse").split(",") if x.strip()
+)
+
+
+def _norm(name) -> str:
+    return (name or "").strip().lower()
+
+
+def _parent_id(location: dict):
+    if location.get("parent_id") is not None:
+        return location["parent_id"]
+    parent = location.get("parent")
+    return parent.get("id") if isinstance(parent, dict) else None
+
+
+class _Snapshot:
+    """One complete build of the tree; swapped in whole so readers never see a partial one."""
+
+    __slots__ = ("locations", "names", "warehouse_ids", "warehouse_names", "expires_at")
+
+    def __init__(self, locations, warehouse_roots, ttl):
+        locations = [loc for loc in locations if isinstance(loc, dict) and loc.get("id") is not None]
+        self.locations = locations
+        self.names = {loc["id"]: loc.get("name") for loc in locations}
+
+        children = {}
+        for loc in locations:
+            children.setdefault(_parent_id(loc), []).append(loc["id"])
+        stack = [i for i, name in self.names.items() if _norm(name) in warehouse_roots]
+        inside = set()
+        while stack:
+            location_id = stack.pop()
+            if location_id not in inside:
+                inside.add(location_id)
+                stack.extend(children.get(location_id, ()))
+        self.warehouse_ids = frozenset(inside)
+
+        # Webhooks only carry names: a name counts as warehouse if it is a
+        # configured root, or every folder with that name is in the subtree
+        outside = {_norm(n) for i, n in self.names.items() if i not in inside}
+        self.warehouse_names = frozenset(
+            warehouse_roots | ({_norm(self.names[i]) for i in inside} - outside)
+        )
+        self.expires_at = time.monotonic() + ttl
+
+
+class LocationTree:
+    """
+    Process-wide, TTL-cached copy of Sortly's location tree: id -> name, and
+    constant-time "is this inside the warehouse subtree" by id or name.
+    Until the first fetch succeeds, only WAREHOUSE_NAMES count as warehouse.
+    """
+
+    def __init__(self, warehouse_roots=WAREHOUSE_NAMES, ttl=LOCATION_TREE_TTL_SECONDS):
+        self.warehouse_roots = frozenset(warehouse_roots)
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._snapshot = None
+        self._retry_at = 0.0
+
+    def _fetch(self) -> list:
+        locations = []
+        page = 1
+        while True:
+            res = sortly_client.get("/locations", params={"page": page})
+            if res.status_code != 200:
+                raise SortlyAPIError(res.status_code, res.text)
+            body = res.json()
+            locations.extend(body.get("data", []))
+            next_page = (body.get("meta") or {}).get("next_page")
+            if not next_page:
+                return locations
+            page = int(next_page)
+
+    def refresh(self):
+        """Fetch the tree now. On failure the previous tree stays in use."""
+        try:
+            snapshot = _Snapshot(self._fetch(), self.warehouse_roots, self.ttl)
+        except (sortly_client.RequestException, SortlyAPIError, ValueError) as e:
+            self._retry_at = time.monotonic() + LOCATION_TREE_RETRY_SECONDS
+            logger.warning("location tree refresh failed", extra={"error": str(e)})
+            return
+        self._snapshot = snapshot
+
+    def invalidate(self):
+        """Force a refetch on next use (e.g. after a folder changed in Sortly)."""
+        self._retry_at = 0.0
+        snapshot = self._snapshot
+        if snapshot is not None:
+            snapshot.expires_at = 0.0
+
+    def _current(self):
+        snapshot = self._snapshot
+        now = time.monotonic()
+        if (snapshot is None or now >= snapshot.expires_at) and now >= self._retry_at:
+            # One caller refetches; the rest keep using the stale tree meanwhile
+            blocking = snapshot is None
+            if self._lock.acquire(blocking=blocking):
+                try:
+                    current = self._snapshot
+                    if (current is None or time.monotonic() >= current.expires_at) \
+                            and time.monotonic() >= self._retry_at:
+                        self.refresh()
+                finally:
+                    self._lock.release()
+            snapshot = self._snapshot
+        return snapshot
+
+    def name(self, location_id):
+        if location_id is None:
+            return None
+        snapshot = self._current()
+        return snapshot.names.get(location_id) if snapshot else None
+
+    def in_warehouse(self, location_id=None, name=None) -> bool:
+        snapshot = self._current()
+        if snapshot is not None and location_id is not None and location_id in snapshot.names:
+            return location_id in snapshot.warehouse_ids
+        key = _norm(name)
+        if snapshot is not None:
+            return key in snapshot.warehouse_names
+        return key in self.warehouse_roots
+
+    def locations(self) -> list:
+        snapshot = self._current()
+        return list(snapshot.locations) if snapshot else []
+
+    def report(self) -> dict:
+        snapshot = self._snapshot
+        return {
+            "locations": len(snapshot.names) if snapshot else 0,
+            "warehouse_ids": sorted(snapshot.warehouse_ids) if snapshot else [],
+            "warehouse_names": sorted(snapshot.warehouse_names if snapshot else self.warehouse_roots),
+            "expires_in": round(snapshot.expires_at - time.monotonic(), 1) if snapshot else None,
+        }
+
+
+location_tree = LocationTree()
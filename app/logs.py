@@ -0,0 +1,123 @@
+import atexit
+import copy
+import json
+import logging
+import os
+import queue
+import random
+import sys
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+
+# Everything under the "app" logger is formatted as one key=value line and
+# written by a background thread, so request handlers only pay for a queue put.
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.getenv("LOG_FORMAT", "kv").lower()  # kv | json
+# Fraction of webhook payloads logged at DEBUG, and the most characters kept
+LOG_PAYLOAD_SAMPLE_RATE = float(os.getenv("LOG_PAYLOAD_SAMPLE_RATE", "0"))
+LOG_PAYLOAD_MAX_CHARS = int(os.getenv("LOG_PAYLOAD_MAX_CHARS", "2000"))
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+
+# Attributes every LogRecord has; anything else came in through `extra=`
+_RESERVED = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime", "taskName"}
+
+_listener = None
+
+
+def _fields(record) -> dict:
+    return {k: v for k, v in vars(record).items() if k not in _RESERVED and not k.startswith("_")}
+
+
+def _kv_value(value) -> str:
+    text = value if isinstance(value, str) else json.dumps(value, default=str, separators=(",", ":"))
+    if text == "" or any(c in text for c in ' ="\n'):
+        return json.dumps(text)
+    return text
+
+
+class KeyValueFormatter(logging.Formatter):
+    """ts=... level=INFO logger=app.x msg="..." key=value ..."""
+
+    def format(self, record):
+        parts = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+            **_fields(record),
+        }
+        if record.exc_text:
+            parts["exc"] = record.exc_text
+        return " ".join(f"{k}={_kv_value(v)}" for k, v in parts.items())
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        doc = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+            **_fields(record),
+        }
+        if record.exc_text:
+            doc["exc"] = record.exc_text
+        return json.dumps(doc, default=str, separators=(",", ":"))
+
+
+class _NonBlockingQueueHandler(QueueHandler):
+    """Keeps `extra=` fields intact and drops records rather than block when full."""
+
+    def prepare(self, record):
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            pass
+
+
+def configure():
+    """Attach the queue-backed handler to the "app" logger (idempotent)."""
+    global _listener
+    if _listener is not None:
+        return
+    output = logging.StreamHandler(sys.stdout)
+    output.setFormatter(JsonFormatter() if LOG_FORMAT == "json" else KeyValueFormatter())
+
+    records = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+    logger = logging.getLogger("app")
+    logger.setLevel(LOG_LEVEL)
+    logger.addHandler(_NonBlockingQueueHandler(records))
+    logger.propagate = False
+
+    _listener = QueueListener(records, output, respect_handler_level=True)
+    _listener.start()
+    atexit.register(shutdown)
+
+
+def shutdown():
+    """Flush queued records and stop the writer thread."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def sample_payload() -> bool:
+    return LOG_PAYLOAD_SAMPLE_RATE > 0 and random.random() < LOG_PAYLOAD_SAMPLE_RATE
+
+
+def payload_preview(payload) -> str:
+    """Compact JSON for a log field, cut to LOG_PAYLOAD_MAX_CHARS."""
+    text = payload if isinstance(payload, str) else json.dumps(payload, default=str, separators=(",", ":"))
+    if len(text) > LOG_PAYLOAD_MAX_CHARS:
+        return text[:LOG_PAYLOAD_MAX_CHARS] + f"...(+{len(text) - LOG_PAYLOAD_MAX_CHARS} chars)"
+    return text
@@ -0,0 +1,232 @@
+import contextvars
+import threading
+import time
+
+from sqlalchemy import event
+
+# Prometheus text exposition, hand-rolled so the app needs no extra client
+# library. Histograms are cumulative per label set, as Prometheus expects.
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 250)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names, values, extra=None) -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _num(value) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self):
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} counter"
+        with self._lock:
+            values = dict(self._values)
+        for labels, value in sorted(values.items()):
+            yield f"{self.name}{_labels(self.labelnames, labels)} {_num(value)}"
+
+
+class Histogram:
+    def __init__(self, name, help_text, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._series = {}  # labels -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labels):
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+                    break
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self):
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} histogram"
+        with self._lock:
+            snapshot = {labels: list(series) for labels, series in self._series.items()}
+        for labels, series in sorted(snapshot.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                le = 'le="' + _num(float(bound)) + '"'
+                yield f"{self.name}_bucket{_labels(self.labelnames, labels, le)} {cumulative}"
+            inf = 'le="+Inf"'
+            yield f"{self.name}_bucket{_labels(self.labelnames, labels, inf)} {series[-1]}"
+            yield f"{self.name}_sum{_labels(self.labelnames, labels)} {_num(float(series[-2]))}"
+            yield f"{self.name}_count{_labels(self.labelnames, labels)} {series[-1]}"
+
+
+REGISTRY = []
+
+
+def _register(metric):
+    REGISTRY.append(metric)
+    return metric
+
+
+http_requests = _register(Counter(
+    "http_requests_total", "HTTP requests by route and status.", ("method", "route", "status")))
+http_latency = _register(Histogram(
+    "http_request_duration_seconds", "Time to response headers, per route.", ("method", "route")))
+http_db_queries = _register(Histogram(
+    "http_request_db_queries", "SQL statements executed per request (N+1 canary).",
+    ("method", "route"), QUERY_COUNT_BUCKETS))
+http_db_time = _register(Histogram(
+    "http_request_db_seconds", "Time spent in SQL per request.", ("method", "route")))
+db_queries = _register(Counter(
+    "db_queries_total", "SQL statements executed, inside a request or in background workers.", ("origin",)))
+db_time = _register(Counter(
+    "db_query_seconds_total", "Time spent in SQL, by origin.", ("origin",)))
+sortly_requests = _register(Counter(
+    "sortly_requests_total", "Sortly API calls by endpoint and status.", ("endpoint", "status")))
+sortly_latency = _register(Histogram(
+    "sortly_request_duration_seconds", "Sortly API call latency, retries included.", ("endpoint",)))
+sortly_syncs = _register(Counter(
+    "sortly_sync_runs_total", "Completed Sortly sync runs by outcome.", ("outcome",)))
+sortly_sync_latency = _register(Histogram(
+    "sortly_sync_duration_seconds", "Wall time of one Sortly sync run.", (),
+    (0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)))
+
+
+def render() -> str:
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+# ---------- Per-request accounting ----------
+
+class RequestStats:
+    __slots__ = ("queries", "db_seconds")
+
+    def __init__(self):
+        self.queries = 0
+        self.db_seconds = 0.0
+
+
+# Set by the middleware; the same object is seen from threadpool handlers
+# because run_in_threadpool copies the context (not the value).
+_current = contextvars.ContextVar("request_stats", default=None)
+
+
+def _route_label(scope) -> str:
+    route = scope.get("route")
+    # Unmatched paths share one label so scanners can't blow up cardinality
+    return getattr(route, "path", None) or "unmatched"
+
+
+class MetricsMiddleware:
+    """ASGI middleware: per-route latency and per-request SQL counts."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats()
+        token = _current.set(stats)
+        start = time.perf_counter()
+        status = {"code": 500, "latency": None}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+                status["latency"] = time.perf_counter() - start
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _current.reset(token)
+            method = scope.get("method", "")
+            route = _route_label(scope)
+            latency = status["latency"] if status["latency"] is not None else time.perf_counter() - start
+            http_requests.inc(method, route, str(status["code"]))
+            http_latency.observe(latency, method, route)
+            http_db_queries.observe(stats.queries, method, route)
+            http_db_time.observe(stats.db_seconds, method, route)
+
+
+# ---------- SQLAlchemy hooks ----------
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    starts = conn.info.get("query_start")
+    if not starts:
+        return
+    elapsed = time.perf_counter() - starts.pop()
+    stats = _current.get()
+    if stats is not None:
+        stats.queries += 1
+        stats.db_seconds += elapsed
+        origin = "request"
+    else:
+        origin = "background"
+    db_queries.inc(origin)
+    db_time.inc(origin, amount=elapsed)
+
+
+def _handle_error(exception_context):
+    conn = exception_context.connection
+    starts = conn.info.get("query_start") if conn is not None else None
+    if starts:
+        starts.pop()
+
+
+def instrument_engine(engine):
+    """Count statements and SQL time on `engine` (idempotent)."""
+    if event.contains(engine, "before_cursor_execute", _before_cursor_execute):
+        return
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(engine, "handle_error", _handle_error)
+
+
+# ---------- Sortly ----------
+
+def observe_sortly(endpoint: str, elapsed_s: float, status):
+    sortly_requests.inc(endpoint, str(status) if status is not None else "error")
+    sortly_latency.observe(elapsed_s, endpoint)
+
+
+def observe_sync(elapsed_s: float, error):
+    sortly_syncs.inc("error" if error else "ok")
+    sortly_sync_latency.observe(elapsed_s)
@@ -0,0 +1,159 @@
+import hashlib
+import logging
+
+from sqlalchemy import inspect, text
+from sqlalchemy.exc import DBAPIError
+
+from app.database import Base
+from app import models  # noqa: F401  (registers every table on Base.metadata)
+
+logger = logging.getLogger(__name__)
+
+
+# pg_advisory_xact_lock key serialising boot-time DDL across processes
+SCHEMA_LOCK_KEY = 0x5C4E3A
+
+
+def add_column(table: str, column: str, ddl_type: str):
+    """ALTER TABLE ... ADD COLUMN, skipped when the column already exists."""
+    def migrate(conn):
+        if conn.dialect.name == "postgresql":
+            conn.execute(text(f"ALTER TABLE {table} ADD COLUMN IF NOT EXISTS {column} {ddl_type}"))
+        elif column not in {c["name"] for c in inspect(conn).get_columns(table)}:
+            conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {ddl_type}"))
+    return migrate
+
+
+def merge_duplicate_job_items(conn):
+    """
+    Older databases could hold one job item name twice; fold each set into
+    its lowest id (quantities summed) so the unique index can be built.
+    """
+    duplicates = conn.execute(text(
+        "SELECT job_id, name, MIN(id), SUM(current_qty) FROM job_items "
+        "WHERE name IS NOT NULL GROUP BY job_id, name HAVING COUNT(*) > 1"
+    )).all()
+    for job_id, name, keep_id, qty in duplicates:
+        conn.execute(text("UPDATE job_items SET current_qty = :qty WHERE id = :id"), {"qty": qty, "id": keep_id})
+        conn.execute(
+            text("DELETE FROM job_items WHERE job_id = :job_id AND name = :name AND id <> :id"),
+            {"job_id": job_id, "name": name, "id": keep_id},
+        )
+    if duplicates:
+        logger.warning("merged duplicate job items", extra={"groups": len(duplicates)})
+
+
+def trigram_indexes(table: str, columns):
+    """Postgres only: pg_trgm GIN indexes for LIKE '%q%' / 'q%' search."""
+    def migrate(conn):
+        if conn.dialect.name != "postgresql":
+            return
+        try:
+            with conn.begin_nested():
+                conn.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+        except DBAPIError as e:
+            # Needs CREATE privilege on the database; b-tree indexes still apply
+            logger.warning("pg_trgm unavailable; trigram indexes skipped", extra={"error": str(e.orig)})
+            return
+        for column in columns:
+            conn.execute(text(
+                f"CREATE INDEX IF NOT EXISTS ix_{table}_{column}_trgm "
+                f"ON {table} USING gin ({column} gin_trgm_ops)"
+            ))
+    return migrate
+
+
+# Idempotent DDL that create_all() can't apply to tables that already exist.
+# Add to the end unless a step has to run before an existing one; each entry
+# (SQL string or callable taking a connection) must be safe to re-run on every
+# boot.
+MIGRATIONS = [
+    merge_duplicate_job_items,  # must precede the unique index below
+    "CREATE UNIQUE INDEX IF NOT EXISTS ux_job_items_job_id_name ON job_items (job_id, name)",
+    add_column("sortly_cache", "sortly_updated_at", "TIMESTAMP"),
+    "CREATE INDEX IF NOT EXISTS ix_scans_job_id_id ON scans (job_id, id)",
+    # sortly_cache became the full catalog mirror (app/catalog.py)
+    add_column("sortly_cache", "sku", "VARCHAR"),
+    add_column("sortly_cache", "quantity", "FLOAT"),
+    add_column("sortly_cache", "parent_id", "INTEGER"),
+    add_column("sortly_cache", "location", "VARCHAR"),
+    add_column("sortly_cache", "name_key", "VARCHAR"),
+    add_column("sortly_cache", "sku_key", "VARCHAR"),
+    "UPDATE sortly_cache SET name_key = lower(trim(name)), location = last_location "
+    "WHERE name_key IS NULL AND name IS NOT NULL",
+    "CREATE INDEX IF NOT EXISTS ix_sortly_cache_name_key ON sortly_cache (name_key)",
+    "CREATE INDEX IF NOT EXISTS ix_sortly_cache_sku_key ON sortly_cache (sku_key)",
+    trigram_indexes("sortly_cache", ["name_key", "sku_key"]),
+    # Resume point for deltas Sortly returns out of (updated_at, id) order
+    add_column("sortly_sync_state", "resume_since", "TIMESTAMP"),
+    add_column("sortly_sync_state", "resume_page", "INTEGER"),
+    add_column("sortly_sync_state", "pending_watermark", "TIMESTAMP"),
+    add_column("sortly_sync_state", "pending_cursor_id", "INTEGER"),
+]
+
+
+def _apply_migrations(conn):
+    for migration in MIGRATIONS:
+        if callable(migration):
+            migration(conn)
+        else:
+            conn.execute(text(migration))
+
+
+def run_migrations(engine):
+    with engine.begin() as conn:
+        _apply_migrations(conn)
+
+
+def _current_fingerprint(conn):
+    if not inspect(conn).has_table("schema_version"):
+        return None  # fresh database
+    return conn.execute(text("SELECT fingerprint FROM schema_version WHERE id = 1")).scalar()
+
+
+def schema_fingerprint() -> str:
+    """
+    Hash of the tables, columns and indexes the code expects, plus the number
+    of migrations (append only). Computed from metadata, no database access.
+    """
+    parts = [f"migrations:{len(MIGRATIONS)}"]
+    for name, table in sorted(Base.metadata.tables.items()):
+        parts.append(name)
+        parts.extend(f"{c.name}:{c.type}:{c.nullable}" for c in table.columns)
+        parts.extend(sorted(i.name for i in table.indexes))
+    return hashlib.sha256("\n".join(parts).encode()).hexdigest()[:16]
+
+
+def ensure_schema(engine) -> bool:
+    """
+    Bring the database up to date only when needed: one SELECT against the
+    schema_version row on a warm database, create_all() plus MIGRATIONS
+    otherwise. Returns True if DDL ran.
+
+    The DDL runs in one transaction. On Postgres it holds an advisory lock,
+    so replicas booting together wait for the first one instead of racing
+    it, and then see its fingerprint and skip.
+    """
+    fingerprint = schema_fingerprint()
+    with engine.connect() as conn:
+        current = _current_fingerprint(conn)
+    if current == fingerprint:
+        return False
+
+    with engine.begin() as conn:
+        if conn.dialect.name == "postgresql":
+            conn.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": SCHEMA_LOCK_KEY})
+            current = _current_fingerprint(conn)
+            if current == fingerprint:
+                return False
+        Base.metadata.create_all(bind=conn)
+        _apply_migrations(conn)
+        conn.execute(
+            text(
+                "INSERT INTO schema_version (id, fingerprint, applied_at) VALUES (1, :f, CURRENT_TIMESTAMP) "
+                "ON CONFLICT (id) DO UPDATE SET fingerprint = excluded.fingerprint, applied_at = excluded.applied_at"
+            ),
+            {"f": fingerprint},
+        )
+    logger.info("schema updated", extra={"fingerprint": fingerprint, "previous": current})
+    return True
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, DateTime
+from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, Float, Index, Text
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from app.database import Base
@@ -15,6 +15,10 @@ class Job(Base):
 
 class JobItem(Base):
     __tablename__ = "job_items"
+    __table_args__ = (
+        # One row per SKU per job; also the lookup path for every decrement
+        Index("ux_job_items_job_id_name", "job_id", "name", unique=True),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     job_id = Column(Integer, ForeignKey("jobs.id"))
@@ -25,6 +29,10 @@ class JobItem(Base):
 
 class Scan(Base):
     __tablename__ = "scans"
+    __table_args__ = (
+        # Newest-first history per job, paged by id
+        Index("ix_scans_job_id_id", "job_id", "id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     job_id = Column(Integer, ForeignKey("jobs.id"))
@@ -33,15 +41,140 @@ class Scan(Base):
     scanned_at = Column(DateTime, default=datetime.utcnow)
 
 
-class SortlyItemState(Base):
+class ScanRollup(Base):
     """
-    Tracks the last known location and timestamp for Sortly items.
-    Used to detect when an item leaves the Warehouse.
+    Picks per job item per minute, maintained as decrements happen so
+    stats never have to aggregate the raw scans table.
     """
-    __tablename__ = "sortly_item_state"
+    __tablename__ = "scan_rollups"
+    __table_args__ = (
+        Index("ux_scan_rollups_job_item_bucket", "job_id", "item_name", "bucket_start", unique=True),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    job_id = Column(Integer, ForeignKey("jobs.id"), nullable=False)
+    item_name = Column(String, nullable=False)
+    bucket_start = Column(DateTime, nullable=False)
+    count = Column(Integer, nullable=False, default=0)
+
+
+class SortlyItem(Base):
+    """
+    Local mirror of the Sortly catalog, kept current by the delta sync and
+    item-move webhooks so lookups don't need a Sortly round trip.
+    `location` is the latest known location from either source;
+    `last_location` is only written by the sync, which compares against it
+    to detect items leaving the Warehouse.
+    """
+    __tablename__ = "sortly_cache"
 
     id = Column(Integer, primary_key=True, index=True)
     sortly_id = Column(Integer, unique=True, index=True)
     name = Column(String)
+    sku = Column(String, nullable=True)
+    quantity = Column(Float, nullable=True)
+    parent_id = Column(Integer, nullable=True)
+    location = Column(String, nullable=True)
     last_location = Column(String)
-    last_seen = Column(DateTime)
+    last_seen = Column(DateTime, default=datetime.utcnow)
+    # Sortly's own updated_at for the copy we hold; unchanged items are skipped
+    sortly_updated_at = Column(DateTime, nullable=True)
+    # Lower-cased search keys (prefix index; trigram GIN on Postgres)
+    name_key = Column(String, nullable=True, index=True)
+    sku_key = Column(String, nullable=True, index=True)
+
+
+class SortlySyncState(Base):
+    """
+    Incremental sync watermark: the highest Sortly updated_at processed so
+    far, with the Sortly id as tie-break for items sharing that timestamp.
+    While a delta is only partly read (budget or error), resume_* hold
+    where to continue it and pending_* the highest mark seen so far.
+    """
+    __tablename__ = "sortly_sync_state"
+
+    name = Column(String, primary_key=True)
+    watermark = Column(DateTime, nullable=True)
+    cursor_id = Column(Integer, nullable=True)
+    resume_since = Column(DateTime, nullable=True)
+    resume_page = Column(Integer, nullable=True)
+    pending_watermark = Column(DateTime, nullable=True)
+    pending_cursor_id = Column(Integer, nullable=True)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+class SyncLease(Base):
+    """
+    Cross-process single-flight lock for background jobs (one row per job
+    name), plus the status of the last run so any replica can report it.
+    """
+    __tablename__ = "sync_leases"
+
+    name = Column(String, primary_key=True)
+    holder = Column(String, nullable=True)
+    expires_at = Column(DateTime, nullable=True)
+    last_started_at = Column(DateTime, nullable=True)
+    last_finished_at = Column(DateTime, nullable=True)
+    last_success_at = Column(DateTime, nullable=True)
+    last_duration_ms = Column(Integer, nullable=True)
+    last_items = Column(Integer, nullable=True)
+    last_exits = Column(Integer, nullable=True)
+    last_error = Column(Text, nullable=True)
+
+
+class SortlyWebhookEvent(Base):
+    """
+    Durable inbox for Sortly webhooks. The route only inserts here and acks;
+    the background worker applies pending rows in batches.
+    """
+    __tablename__ = "sortly_webhook_events"
+    __table_args__ = (
+        Index("ix_sortly_webhook_events_status_id", "status", "id"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    # Sortly transaction id (or a payload hash) — duplicate deliveries collide here
+    idempotency_key = Column(String, unique=True, nullable=False)
+    payload = Column(Text, nullable=False)
+    status = Column(String, nullable=False, default="pending")
+    claimed_by = Column(String, nullable=True)
+    claimed_at = Column(DateTime, nullable=True)
+    received_at = Column(DateTime, default=datetime.utcnow)
+    processed_at = Column(DateTime, nullable=True)
+    result = Column(Text, nullable=True)
+
+
+class SortlyPendingWrite(Base):
+    """
+    Write-behind queue for quantities pushed back to Sortly: one row per
+    Sortly item holding only the latest quantity, so repeated changes to an
+    item collapse into a single PUT. `version` bumps on every enqueue; a
+    flush only deletes the row if nothing newer arrived meanwhile.
+    """
+    __tablename__ = "sortly_pending_writes"
+    __table_args__ = (
+        Index("ix_sortly_pending_writes_next_attempt_at", "next_attempt_at"),
+    )
+
+    sortly_id = Column(Integer, primary_key=True)
+    quantity = Column(Float, nullable=False)
+    version = Column(Integer, nullable=False, default=1)
+    attempts = Column(Integer, nullable=False, default=0)
+    next_attempt_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    last_error = Column(Text, nullable=True)
+    claimed_by = Column(String, nullable=True)
+    claimed_at = Column(DateTime, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow)
+
+
+class SchemaVersion(Base):
+    """
+    Single row recording which schema the database was last brought up to.
+    Boot compares it with the code's fingerprint and skips DDL on a match.
+    """
+    __tablename__ = "schema_version"
+
+    id = Column(Integer, primary_key=True)
+    fingerprint = Column(String, nullable=False)
+    applied_at = Column(DateTime, default=datetime.utcnow)
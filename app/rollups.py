@@ -0,0 +1,85 @@
+from datetime import datetime, timedelta
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from app.database import bulk_upsert
+from app.models import JobItem, ScanRollup
+
+BUCKET = timedelta(minutes=1)
+
+
+def bucket_start(at: datetime) -> datetime:
+    return at.replace(second=0, microsecond=0)
+
+
+def record_picks(db: Session, job_id: int, item_name: str, count: int, at: datetime | None = None):
+    """Add `count` picks to the item's current minute bucket (caller commits)."""
+    if count <= 0:
+        return
+    row = {
+        "job_id": job_id,
+        "item_name": item_name,
+        "bucket_start": bucket_start(at or datetime.utcnow()),
+        "count": count,
+    }
+    bulk_upsert(
+        db, ScanRollup, [row],
+        conflict_cols=["job_id", "item_name", "bucket_start"],
+        set_={"count": lambda excluded: ScanRollup.count + excluded.count},
+    )
+
+
+def job_stats(db: Session, job_id: int, window_minutes: int = 60, hours: int = 24) -> dict:
+    """Throughput and per-item progress for a job, read only from rollups."""
+    now = datetime.utcnow()
+
+    picked = dict(
+        db.query(ScanRollup.item_name, func.sum(ScanRollup.count))
+        .filter(ScanRollup.job_id == job_id)
+        .group_by(ScanRollup.item_name)
+        .all()
+    )
+    items = []
+    for name, remaining in (
+        db.query(JobItem.name, JobItem.current_qty)
+        .filter(JobItem.job_id == job_id)
+        .order_by(JobItem.id)
+    ):
+        done = int(picked.get(name) or 0)
+        remaining = remaining or 0
+        total = done + remaining
+        items.append({
+            "name": name,
+            "picked": done,
+            "remaining": remaining,
+            "progress": round(done / total, 4) if total else 1.0,
+        })
+
+    # Per-minute totals across items for the last `hours`, folded to hours here
+    since = bucket_start(now) - timedelta(hours=hours) + BUCKET
+    per_minute = (
+        db.query(ScanRollup.bucket_start, func.sum(ScanRollup.count))
+        .filter(ScanRollup.job_id == job_id, ScanRollup.bucket_start >= since)
+        .group_by(ScanRollup.bucket_start)
+        .all()
+    )
+    hourly = {}
+    window_start = bucket_start(now) - timedelta(minutes=window_minutes) + BUCKET
+    window_picks = 0
+    for start, count in per_minute:
+        hour = start.replace(minute=0)
+        hourly[hour] = hourly.get(hour, 0) + int(count)
+        if start >= window_start:
+            window_picks += int(count)
+
+    return {
+        "job_id": job_id,
+        "total_picked": sum(i["picked"] for i in items),
+        "total_remaining": sum(i["remaining"] for i in items),
+        "window_minutes": window_minutes,
+        "picks_in_window": window_picks,
+        "picks_per_minute": round(window_picks / window_minutes, 3),
+        "hourly": [{"hour": hour, "picks": hourly[hour]} for hour in sorted(hourly)],
+        "items": items,
+    }
@@ -1,53 +1,222 @@
-from fastapi import APIRouter, HTTPException, Depends, Query
-from sqlalchemy.orm import Session
-from app.database import get_db
-from app.models import Job, JobItem, Scan  # 👈 include Scan
+import asyncio
+from datetime import datetime, timezone
+from typing import Optional
+from fastapi import APIRouter, HTTPException, Depends, Query, Request, Response
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from sqlalchemy import func, insert, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, selectinload
+from app.database import get_async_db, get_db
+from app.events import hub, track_job, track_qty
+from app.job_import import IMPORT_CHUNK_ROWS, CsvRows, ItemLoader, NdjsonRows, PickListError, iter_lines
+from app.models import Job, JobItem, Scan, ScanRollup  # 👈 include Scan
+from app.rollups import job_stats
 from app.schemas import JobInput
+from app.routing_index import routing_index
+from app.utils import invalidate_job_matcher
 
 router = APIRouter(prefix="/job", tags=["Jobs"])
 
 # ---------- CREATE ----------
 @router.post("")
-def create_job(job_input: JobInput, db: Session = Depends(get_db)):
-    job = Job(name=job_input.name)
+async def create_job(job_input: JobInput, db: AsyncSession = Depends(get_async_db)):
+    return await db.run_sync(_create_job, job_input)
+
+
+def _create_job(db: Session, job_input: JobInput):
+    # One row per SKU: repeated lines in the pick list are summed
+    counts = {}
     for item in job_input.items:
-        job.items.append(JobItem(name=item.name, current_qty=item.count))
+        counts[item.name] = counts.get(item.name, 0) + item.count
+
+    job = Job(name=job_input.name)
+    for name, count in counts.items():
+        job.items.append(JobItem(name=name, current_qty=count))
     db.add(job)
+    db.flush()
+    track_job(db, "job_created", job.id)
     db.commit()
     db.refresh(job)
+    invalidate_job_matcher(job.id)
+    routing_index.set_job(job.id, job.name, [(i.id, i.name) for i in job.items])
     return {"id": job.id, "name": job.name, "item_count": len(job.items)}
 
+# ---------- STREAM ----------
+STREAM_HEARTBEAT_SECONDS = 15
+
+
+@router.get("/stream")
+async def stream_job_changes(request: Request):
+    """
+    Server-Sent Events feed of job changes, replacing Dashboard polling.
+    `qty` events carry {"job_id", "items": [{"name", "current_qty"}]};
+    job_created / job_updated / job_deleted tell the client to refetch that job.
+    """
+    queue = hub.subscribe()
+
+    async def frames():
+        try:
+            yield "retry: 3000\n\n"
+            while not await request.is_disconnected():
+                try:
+                    frame = await asyncio.wait_for(queue.get(), timeout=STREAM_HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": ping\n\n"
+                    continue
+                if frame is None:  # fell too far behind; client will reconnect
+                    return
+                yield frame
+        finally:
+            hub.unsubscribe(queue)
+
+    return StreamingResponse(
+        frames(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+# ---------- IMPORT ----------
+def _create_import_job(db: Session, name: str) -> int:
+    if db.query(Job.id).filter(Job.name == name).first():
+        raise HTTPException(status_code=409, detail=f"Job '{name}' already exists")
+    job = Job(name=name)
+    db.add(job)
+    db.flush()
+    return job.id
+
+
+def _finish_import(db: Session, loader: ItemLoader, job_id: int, name: str):
+    loader.finish()
+    track_job(db, "job_created", job_id)
+    db.commit()
+    items = db.query(JobItem.id, JobItem.name).filter(JobItem.job_id == job_id).all()
+    invalidate_job_matcher(job_id)
+    routing_index.set_job(job_id, name, [(i.id, i.name) for i in items])
+    return len(items)
+
+
+@router.post("/import")
+async def import_job(
+    request: Request,
+    name: str = Query(..., min_length=1, description="Name of the job to create"),
+    format: Optional[str] = Query(None, pattern="^(csv|ndjson)$"),
+    db: Session = Depends(get_db),
+):
+    """
+    Create a job from a streamed pick list of any size.
+    Body is CSV (`name,count`, optional header) or NDJSON
+    ({"name": ..., "count": ...} per line); the format comes from `format`
+    or the Content-Type. Lines are parsed as they arrive and loaded in
+    chunks (COPY on Postgres), all in one transaction. Repeated SKUs are summed.
+    """
+    content_type = request.headers.get("content-type", "")
+    if format is None:
+        format = "ndjson" if "json" in content_type else "csv"
+    parser = NdjsonRows() if format == "ndjson" else CsvRows()
+
+    job_id = await run_in_threadpool(_create_import_job, db, name)
+    loader = await run_in_threadpool(ItemLoader, db, job_id)
+    chunk = []
+    try:
+        async for line_no, line in iter_lines(request.stream()):
+            row = parser.parse(line_no, line)
+            if row:
+                chunk.append(row)
+            if len(chunk) >= IMPORT_CHUNK_ROWS:
+                await run_in_threadpool(loader.load, chunk)
+                chunk = []
+        await run_in_threadpool(loader.load, chunk)
+        item_count = await run_in_threadpool(_finish_import, db, loader, job_id, name)
+    except PickListError as e:
+        await run_in_threadpool(db.rollback)
+        raise HTTPException(status_code=400, detail=str(e))
+    except BaseException:
+        await run_in_threadpool(db.rollback)
+        raise
+
+    return {"id": job_id, "name": name, "rows": loader.rows, "item_count": item_count}
+
 # ---------- LIST ----------
 @router.get("/list/all")
-def list_all_jobs(db: Session = Depends(get_db)):
-    jobs = db.query(Job).all()
+async def list_all_jobs(
+    response: Response,
+    active: bool = Query(False, description="Only jobs with quantity left to pick"),
+    summary: bool = Query(False, description="Per-job totals instead of item arrays"),
+    after_id: Optional[int] = Query(None, description="Keyset cursor: last job id seen"),
+    limit: Optional[int] = Query(None, ge=1, le=500),
+    db: AsyncSession = Depends(get_async_db),
+):
+    """
+    List jobs ordered by id. Items are loaded in one extra query (no N+1).
+    When `limit` is set and more jobs remain, the X-Next-After-Id header
+    carries the cursor for the next page.
+    """
+    return await db.run_sync(_list_all_jobs, response, active, summary, after_id, limit)
+
+
+def _list_all_jobs(db: Session, response: Response, active, summary, after_id, limit):
+    if summary:
+        query = (
+            db.query(
+                Job.id,
+                Job.name,
+                func.count(JobItem.id),
+                func.coalesce(func.sum(JobItem.current_qty), 0),
+            )
+            .outerjoin(JobItem, JobItem.job_id == Job.id)
+            .group_by(Job.id, Job.name)
+        )
+    else:
+        query = db.query(Job).options(selectinload(Job.items))
+
+    if active:
+        query = query.filter(Job.items.any(JobItem.current_qty > 0))
+    if after_id is not None:
+        query = query.filter(Job.id > after_id)
+    query = query.order_by(Job.id)
+    if limit:
+        query = query.limit(limit)
+
+    rows = query.all()
+    if limit and len(rows) == limit:
+        response.headers["X-Next-After-Id"] = str(rows[-1][0] if summary else rows[-1].id)
+
+    if summary:
+        return [
+            {"id": job_id, "name": name, "item_count": item_count, "remaining_qty": remaining}
+            for job_id, name, item_count, remaining in rows
+        ]
     return [
         {
             "id": j.id,
             "name": j.name,
             "items": [{"name": i.name, "current_qty": i.current_qty} for i in j.items],
         }
-        for j in jobs
+        for j in rows
     ]
 
 # ---------- UPDATE SINGLE ITEM ----------
 @router.put("/{job_id}/item")
-def update_single_item(job_id: int, payload: dict, db: Session = Depends(get_db)):
+async def update_single_item(job_id: int, payload: dict, db: AsyncSession = Depends(get_async_db)):
     """
     Update quantity for a single item in a job.
     Expected payload: {"name": "HF-Blue", "count": 8}
     """
+    return await db.run_sync(_update_single_item, job_id, payload)
+
+
+def _update_single_item(db: Session, job_id: int, payload: dict):
     name = payload.get("name")
     count = payload.get("count")
 
     if not name:
         raise HTTPException(status_code=400, detail="Missing item name")
 
-    job = db.query(Job).filter(Job.id == job_id).first()
-    if not job:
+    if not db.query(Job.id).filter(Job.id == job_id).first():
         raise HTTPException(status_code=404, detail="Job not found")
 
-    item = next((i for i in job.items if i.name == name), None)
+    item = db.query(JobItem).filter(JobItem.job_id == job_id, JobItem.name == name).first()
     if not item:
         raise HTTPException(status_code=404, detail=f"Item '{name}' not found in job")
 
@@ -55,6 +224,7 @@ def update_single_item(job_id: int, payload: dict, db: Session = Depends(get_db)
         raise HTTPException(status_code=400, detail="Missing count")
 
     item.current_qty = int(count)
+    track_qty(db, job_id, name, item.current_qty)
     db.commit()
     db.refresh(item)
 
@@ -62,7 +232,11 @@ def update_single_item(job_id: int, payload: dict, db: Session = Depends(get_db)
 
 # ---------- BULK UPDATE ----------
 @router.put("/{job_id}/update-items")
-def update_job_items(job_id: int, payload: dict, db: Session = Depends(get_db)):
+async def update_job_items(job_id: int, payload: dict, db: AsyncSession = Depends(get_async_db)):
+    return await db.run_sync(_update_job_items, job_id, payload)
+
+
+def _update_job_items(db: Session, job_id: int, payload: dict):
     job = db.query(Job).filter(Job.id == job_id).first()
     if not job:
         raise HTTPException(status_code=404, detail="Job not found")
@@ -71,6 +245,12 @@ def update_job_items(job_id: int, payload: dict, db: Session = Depends(get_db)):
     if not isinstance(items_data, list):
         raise HTTPException(status_code=400, detail="Invalid items payload")
 
+    # Reconcile against a name -> id map instead of scanning job.items per row
+    existing_ids = dict(
+        db.query(JobItem.name, JobItem.id).filter(JobItem.job_id == job_id).all()
+    )
+    updates = {}
+    inserts = {}
     for item_data in items_data:
         name = item_data.get("name")
         qty = item_data.get("current_qty")
@@ -78,57 +258,130 @@ def update_job_items(job_id: int, payload: dict, db: Session = Depends(get_db)):
         if not name:
             continue
 
-        existing_item = next((i for i in job.items if i.name == name), None)
-        if existing_item:
+        if name in existing_ids:
             if isinstance(qty, int):
-                existing_item.current_qty = qty
+                updates[existing_ids[name]] = qty
+        elif name in inserts:
+            if isinstance(qty, int):
+                inserts[name] = qty
         else:
-            job.items.append(JobItem(name=name, current_qty=qty or 0))
+            inserts[name] = qty or 0
+
+    if updates:
+        db.execute(update(JobItem), [{"id": i, "current_qty": q} for i, q in updates.items()])
+    if inserts:
+        db.execute(
+            insert(JobItem),
+            [{"job_id": job_id, "name": n, "current_qty": q} for n, q in inserts.items()],
+        )
 
+    track_job(db, "job_updated", job.id)
     db.commit()
-    db.refresh(job)
+
+    items = (
+        db.query(JobItem.id, JobItem.name, JobItem.current_qty)
+        .filter(JobItem.job_id == job_id)
+        .order_by(JobItem.id)
+        .all()
+    )
+    invalidate_job_matcher(job.id)
+    routing_index.set_job(job.id, job.name, [(i.id, i.name) for i in items])
     return {
         "message": f"Job {job.name} updated successfully",
-        "items": [{"name": i.name, "current_qty": i.current_qty} for i in job.items],
+        "items": [{"name": i.name, "current_qty": i.current_qty} for i in items],
     }
 
 # ---------- DELETE ----------
 @router.delete("/{job_name:path}")
-def delete_job(job_name: str, db: Session = Depends(get_db)):
+async def delete_job(job_name: str, db: AsyncSession = Depends(get_async_db)):
+    return await db.run_sync(_delete_job, job_name)
+
+
+def _delete_job(db: Session, job_name: str):
     job = db.query(Job).filter(Job.name == job_name).first()
     if not job:
         raise HTTPException(status_code=404, detail=f"Job '{job_name}' not found")
+    job_id = job.id
+    # scans and scan_rollups reference jobs.id without a cascade
+    db.query(Scan).filter(Scan.job_id == job_id).delete(synchronize_session=False)
+    db.query(ScanRollup).filter(ScanRollup.job_id == job_id).delete(synchronize_session=False)
     db.delete(job)
+    track_job(db, "job_deleted", job_id)
     db.commit()
+    invalidate_job_matcher(job_id)
+    routing_index.remove_job(job_id)
     return {"message": f"Deleted job '{job_name}'"}
 
-# ---------- READ SCANS FOR A JOB (NO TIMESTAMP REQUIRED) ----------
+# ---------- STATS ----------
+@router.get("/{job_id}/stats")
+async def get_job_stats(
+    job_id: int,
+    window_minutes: int = Query(60, ge=1, le=1440),
+    hours: int = Query(24, ge=1, le=168),
+    db: AsyncSession = Depends(get_async_db),
+):
+    """
+    Throughput, picks-per-minute over the last `window_minutes`, an hourly
+    series for the last `hours`, and per-item progress. Served from the
+    scan_rollups table; raw scans are never aggregated here.
+    """
+    return await db.run_sync(_get_job_stats, job_id, window_minutes, hours)
+
+
+def _get_job_stats(db: Session, job_id: int, window_minutes: int, hours: int):
+    if not db.query(Job.id).filter(Job.id == job_id).first():
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job_stats(db, job_id, window_minutes=window_minutes, hours=hours)
+
+# ---------- READ SCANS FOR A JOB ----------
+def _naive_utc(value: Optional[datetime]) -> Optional[datetime]:
+    """scanned_at is stored as naive UTC; convert "...Z" / "+05:00" inputs to match."""
+    if value is not None and value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
 @router.get("/{job_id}/scans")
-def get_scanned_items(
+async def get_scanned_items(
     job_id: int,
+    response: Response,
     limit: int = Query(50, ge=1, le=500),
-    db: Session = Depends(get_db),
+    before_id: Optional[int] = Query(None, description="Keyset cursor: only scans older than this id"),
+    since: Optional[datetime] = Query(None, description="Only scans at or after this time (UTC)"),
+    until: Optional[datetime] = Query(None, description="Only scans before this time (UTC)"),
+    db: AsyncSession = Depends(get_async_db),
 ):
     """
-    Return most recent scans for a job. We sort by Scan.id DESC (no timestamp needed).
-    Response shape is minimal and matches existing schema.
+    Return most recent scans for a job, newest first (Scan.id DESC).
+    Pages walk the (job_id, id) index: pass the X-Next-Before-Id header
+    value back as `before_id` to get the next older page.
     """
-    job = db.query(Job).filter(Job.id == job_id).first()
-    if not job:
+    return await db.run_sync(_get_scanned_items, job_id, response, limit, before_id, since, until)
+
+
+def _get_scanned_items(db: Session, job_id: int, response: Response, limit, before_id, since, until):
+    if not db.query(Job.id).filter(Job.id == job_id).first():
         raise HTTPException(status_code=404, detail="Job not found")
 
-    scans = (
-        db.query(Scan)
-        .filter(Scan.job_id == job_id)
-        .order_by(Scan.id.desc())
-        .limit(limit)
-        .all()
-    )
+    query = db.query(Scan).filter(Scan.job_id == job_id)
+    since, until = _naive_utc(since), _naive_utc(until)
+    if before_id is not None:
+        query = query.filter(Scan.id < before_id)
+    if since is not None:
+        query = query.filter(Scan.scanned_at >= since)
+    if until is not None:
+        query = query.filter(Scan.scanned_at < until)
+    scans = query.order_by(Scan.id.desc()).limit(limit).all()
+
+    if len(scans) == limit:
+        response.headers["X-Next-Before-Id"] = str(scans[-1].id)
 
     return [
         {
             "id": s.id,
-            "item_name": getattr(s, "item_name", None),  # keep it defensive
+            "item_name": s.scanned_name,
+            "location": s.location,
+            "scanned_at": s.scanned_at,
         }
         for s in scans
     ]
@@ -0,0 +1,19 @@
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+
+from app import metrics
+from app.startup import boot
+
+router = APIRouter()
+
+
+@router.get("/metrics", response_class=PlainTextResponse)
+def prometheus_metrics():
+    """Prometheus text exposition of request, DB and Sortly metrics."""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+
+@router.get("/startup")
+def startup_report():
+    """How long this worker took to boot, by phase."""
+    return boot.report()
@@ -1,42 +1,115 @@
 from fastapi import APIRouter, HTTPException, Depends
+from sqlalchemy import insert
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from app.database import get_db
+from app import ledger
+from app.database import get_async_db
 from app.models import Job, JobItem, Scan
 
 router = APIRouter(prefix="/scan", tags=["Scans"])
 
 @router.post("/{job_id}")
-def process_scan(job_id: int, payload: dict, db: Session = Depends(get_db)):
+async def process_scan(job_id: int, payload: dict, db: AsyncSession = Depends(get_async_db)):
     """
     Record a scan for an item within a job.
     Expected payload: {"barcode": "HF-Blue"}
     """
+    return await db.run_sync(_process_scan, job_id, payload)
+
+
+def _process_scan(db: Session, job_id: int, payload: dict):
     barcode = payload.get("barcode")
     if not barcode:
         raise HTTPException(status_code=400, detail="Missing barcode")
 
-    job = db.query(Job).filter(Job.id == job_id).first()
-    if not job:
-        raise HTTPException(status_code=404, detail="Job not found")
-
-    item = next((i for i in job.items if i.name == barcode), None)
-    if not item:
-        raise HTTPException(status_code=404, detail=f"Item '{barcode}' not found in job")
-
-    # ✅ Decrement item qty
-    if item.current_qty > 0:
-        item.current_qty -= 1
-    else:
+    # ✅ Decrement item qty (atomic; only succeeds if there is one left)
+    remaining = ledger.decrement(db, job_id, barcode, 1)
+    if remaining is None:
+        if not db.query(Job.id).filter(Job.id == job_id).first():
+            raise HTTPException(status_code=404, detail="Job not found")
+        if ledger.get_qty(db, job_id, barcode) is None:
+            raise HTTPException(status_code=404, detail=f"Item '{barcode}' not found in job")
         raise HTTPException(status_code=400, detail=f"'{barcode}' already at zero")
 
     # ✅ Log scan record
-    new_scan = Scan(job_id=job.id, item_name=barcode)
-    db.add(new_scan)
+    db.add(Scan(job_id=job_id, scanned_name=barcode))
+    db.commit()
+
+    return {
+        "message": f"Scanned {barcode}, remaining: {remaining}",
+        "updated_qty": remaining,
+    }
+
+
+def _parse_batch(entries) -> dict:
+    """Collapse raw reads into {barcode: count}, keeping first-seen order."""
+    counts = {}
+    for entry in entries:
+        if isinstance(entry, str):
+            barcode, count = entry, 1
+        elif isinstance(entry, dict):
+            barcode, count = entry.get("barcode"), entry.get("count", 1)
+        else:
+            raise HTTPException(status_code=400, detail="Invalid scan entry")
+        if not barcode or not isinstance(count, int) or count < 1:
+            raise HTTPException(status_code=400, detail=f"Invalid scan entry: {entry}")
+        counts[barcode] = counts.get(barcode, 0) + count
+    return counts
+
+
+@router.post("/{job_id}/batch")
+async def process_scan_batch(job_id: int, payload: dict, db: AsyncSession = Depends(get_async_db)):
+    """
+    Record a buffered batch of scans in one transaction.
+    Expected payload: {"scans": [{"barcode": "HF-Blue", "count": 3}, "HF-Red", ...]}
+    Each barcode is decremented with a single conditional UPDATE, so a
+    barcode is applied in full or not at all.
+    """
+    return await db.run_sync(_process_scan_batch, job_id, payload)
+
+
+def _process_scan_batch(db: Session, job_id: int, payload: dict):
+    entries = payload.get("scans")
+    if not isinstance(entries, list) or not entries:
+        raise HTTPException(status_code=400, detail="Missing scans")
+    counts = _parse_batch(entries)
+
+    if not db.query(Job.id).filter(Job.id == job_id).first():
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    results = {}
+    scan_rows = []
+    for barcode, count in counts.items():
+        remaining = ledger.decrement(db, job_id, barcode, count)
+        if remaining is not None:
+            results[barcode] = {"status": "ok", "scanned": count, "updated_qty": remaining}
+            scan_rows.extend({"job_id": job_id, "scanned_name": barcode} for _ in range(count))
+
+    # Explain the misses with one lookup instead of one per barcode
+    missed = [b for b in counts if b not in results]
+    if missed:
+        current = dict(
+            db.query(JobItem.name, JobItem.current_qty)
+            .filter(JobItem.job_id == job_id, JobItem.name.in_(missed))
+            .all()
+        )
+        for barcode in missed:
+            if barcode not in current:
+                results[barcode] = {"status": "not_found", "scanned": 0}
+            else:
+                results[barcode] = {
+                    "status": "insufficient",
+                    "scanned": 0,
+                    "requested": counts[barcode],
+                    "updated_qty": current[barcode],
+                }
 
+    if scan_rows:
+        db.execute(insert(Scan), scan_rows)
     db.commit()
-    db.refresh(item)
 
     return {
-        "message": f"Scanned {barcode}, remaining: {item.current_qty}",
-        "updated_qty": item.current_qty,
+        "job_id": job_id,
+        "scanned": len(scan_rows),
+        "results": [{"barcode": b, **results[b]} for b in counts],
     }
@@ -1,118 +1,426 @@
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Query
 from sqlalchemy.orm import Session
 from datetime import datetime, timedelta
-import requests
-from rapidfuzz import process
-from app.database import get_db, Base, engine
-from app.models import Job, JobItem
-import os
+import logging
+from app import catalog, ledger, logs, sortly_client, sortly_writeback, sync_worker
+from app.catalog import item_location, item_parent_id, parse_sortly_time
+from app.locations import location_tree
+from app.sortly_pager import ItemPager, SortlyAPIError
+from app.database import bulk_upsert, get_db
+from app.models import Job, JobItem, SortlyItem, SortlySyncState
+from app.utils import get_job_matcher
 
 router = APIRouter(prefix="/sortly", tags=["Sortly Sync"])
+logger = logging.getLogger(__name__)
 
-SORTLY_API_URL = "https://api.sortly.co/api/v1/items"
-SORTLY_SECRET_KEY = os.getenv("SORTLY_SECRET_KEY")
+@router.get("/client/stats")
+def sortly_client_stats():
+    """Per-endpoint Sortly call counters from the shared HTTP client."""
+    return sortly_client.get_timings()
 
-# --- Internal cache table to track last sync time and location per item ---
-from sqlalchemy import Column, Integer, String, DateTime
 
-class SortlyCache(Base):
-    __tablename__ = "sortly_cache"
-    id = Column(Integer, primary_key=True, index=True)
-    sortly_id = Column(Integer, unique=True, index=True)
-    name = Column(String)
-    last_location = Column(String)
-    last_seen = Column(DateTime, default=datetime.utcnow)
+SYNC_STATE_ITEMS = "items"
+# Ask Sortly for a little before the watermark in case updated_since is
+# exclusive; the (updated_at, id) cursor drops anything already processed.
+WATERMARK_GUARD = timedelta(seconds=1)
 
-# ✅ Correct way to create table
-Base.metadata.create_all(bind=engine)
 
+class _DeltaCursor:
+    """
+    Tracks the (updated_at, id) watermark while a delta is consumed.
+    A delta Sortly returns out of order can't move the watermark until it
+    has been read to the end (and an ordered one can't get past a budget's
+    worth of items sharing one timestamp), so a run cut short records the
+    page it reached and the next run continues that same delta from there.
+    """
 
-# --- Core utility function ---
-def fuzzy_match(name, candidates):
-    result = process.extractOne(name, candidates, score_cutoff=70)
-    return result[0] if result else None
+    def __init__(self, db: Session):
+        self.state = db.get(SortlySyncState, SYNC_STATE_ITEMS)
+        if self.state is None:
+            self.state = SortlySyncState(name=SYNC_STATE_ITEMS)
+            db.add(self.state)
+        self.start = (
+            (self.state.watermark, self.state.cursor_id or 0) if self.state.watermark else None
+        )
+        self.high = self.start
+        self.previous = None
+        # True while Sortly has returned items in (updated_at, id) order; only
+        # then is it safe to persist progress before the whole delta is read
+        self.ordered = True
 
+        self.resume_page = self.state.resume_page if self.state.resume_since else None
+        if self.resume_page:
+            self.since = self.state.resume_since
+            self.ordered = False
+            # Marks below the watermark may still be ahead in this delta
+            self.start = None
+            if self.state.pending_watermark:
+                pending = (self.state.pending_watermark, self.state.pending_cursor_id or 0)
+                self.high = max(self.high, pending) if self.high else pending
+        elif self.start:
+            self.since = self.start[0] - WATERMARK_GUARD
+        else:
+            self.since = datetime.utcnow() - timedelta(hours=24)
 
-@router.get("/sync/{job_id}")
-def sync_with_sortly(job_id: int, db: Session = Depends(get_db)):
+    def updated_since(self) -> str:
+        return self.since.isoformat() + "Z"
+
+    def already_processed(self, mark) -> bool:
+        return self.start is not None and mark is not None and mark <= self.start
+
+    def observe(self, mark):
+        if mark is None:
+            return
+        if self.previous is not None and mark < self.previous:
+            self.ordered = False
+        self.previous = mark
+        if self.high is None or mark > self.high:
+            self.high = mark
+
+    def save(self):
+        """Advance the persisted watermark (caller commits)."""
+        if self.high and self.high != (self.state.watermark, self.state.cursor_id):
+            self.state.watermark, self.state.cursor_id = self.high
+
+    def suspend(self, page):
+        """Record where to continue this delta if the run stops here (caller commits)."""
+        self.state.resume_since = self.since
+        self.state.resume_page = page
+        self.state.pending_watermark, self.state.pending_cursor_id = self.high or (None, None)
+
+    def complete(self):
+        """Whole delta read: jump to the highest mark and drop any resume point."""
+        self.save()
+        self.state.resume_since = self.state.resume_page = None
+        self.state.pending_watermark = self.state.pending_cursor_id = None
+
+    def report(self) -> dict:
+        return {
+            "watermark": self.state.watermark.isoformat() if self.state.watermark else None,
+            "cursor_id": self.state.cursor_id,
+            "resume_page": self.state.resume_page,
+        }
+
+
+def _active_jobs(db: Session):
+    """Jobs that still have something left to pick."""
+    return (
+        db.query(Job)
+        .filter(Job.items.any(JobItem.current_qty > 0))
+        .order_by(Job.id)
+        .all()
+    )
+
+
+def _collect_exits(db: Session, pager: ItemPager, cursor: _DeltaCursor, deduct, skipped, stats, renew=None):
     """
-    Fetch updated Sortly items. 
-    If an item moved out of 'Warehouse', deduct one in our local job.
+    Walk the Sortly delta once, refreshing the catalog mirror, and call
+    `deduct(exits)` with the names of items on each page that just left the
+    Warehouse. The deductions commit together with the page's last_location
+    and watermark, so an exit is never recorded without being applied.
+    Each page costs one SELECT ... IN, one bulk upsert and one commit;
+    `renew(db)`, if given, extends the sync lease in that same commit.
+    Items at or below the watermark, or whose Sortly updated_at matches the
+    mirrored copy, are skipped without touching the mirror.
     """
+    for page in pager.iter_pages():
+        # Skip folders (Sortly marks them differently)
+        exits = []
+        items = []
+        for item in page:
+            updated_at = parse_sortly_time(item.get("updated_at"))
+            mark = (updated_at, item.get("id") or 0) if updated_at else None
+            cursor.observe(mark)
+            if item.get("type") == "folder":
+                skipped.append(item.get("name"))
+            elif cursor.already_processed(mark):
+                stats["unchanged"] += 1
+            else:
+                items.append((item, updated_at))
 
-    headers = {"Authorization": f"Bearer {SORTLY_SECRET_KEY}"}
+        ids = {item.get("id") for item, _ in items}
+        cached = {
+            sortly_id: (last_location, sortly_updated_at)
+            for sortly_id, last_location, sortly_updated_at in (
+                db.query(SortlyItem.sortly_id, SortlyItem.last_location, SortlyItem.sortly_updated_at)
+                .filter(SortlyItem.sortly_id.in_(ids))
+                .all()
+            )
+        } if ids else {}
 
-    # Find job
-    job = db.query(Job).filter(Job.id == job_id).first()
-    if not job:
-        return {"error": f"Job {job_id} not found"}
+        now = datetime.utcnow()
+        rows = {}
+        for item, updated_at in items:
+            sortly_id = item.get("id")
+            name = item.get("name")
+            location = item_location(item)
+
+            # Unknown items start at their current location, so never count as an exit
+            previous, cached_updated_at = cached.get(sortly_id, (location, None))
+            if updated_at is not None and updated_at == cached_updated_at:
+                stats["unchanged"] += 1
+                continue
+
+            # Detect movement out of the Warehouse subtree
+            if (location and location_tree.in_warehouse(name=previous)
+                    and not location_tree.in_warehouse(item_parent_id(item), location)):
+                exits.append(name)
+
+            cached[sortly_id] = (location, updated_at)
+            rows[sortly_id] = {**catalog.item_row(item, updated_at, now), "last_location": location}
 
-    # Get last sync time
-    last_seen = db.query(SortlyCache).order_by(SortlyCache.last_seen.desc()).first()
-    updated_since = (
-        (last_seen.last_seen - timedelta(minutes=10)).isoformat() + "Z"
-        if last_seen else (datetime.utcnow() - timedelta(hours=24)).isoformat() + "Z"
+        bulk_upsert(
+            db, SortlyItem, list(rows.values()),
+            conflict_cols=["sortly_id"],
+            update_cols=catalog.CATALOG_COLUMNS + ["last_location"],
+        )
+        if exits:
+            deduct(exits)
+            stats["exits"] += len(exits)
+        if cursor.ordered:
+            cursor.save()
+        cursor.suspend(pager.resume_page)
+        if renew:
+            renew(db)
+        db.commit()
+
+
+def _job_item_names(db: Session, job_ids) -> dict:
+    """{job_id: [item names]} for the given jobs, from one column-only query."""
+    names = {job_id: [] for job_id in job_ids}
+    rows = (
+        db.query(JobItem.job_id, JobItem.name)
+        .filter(JobItem.job_id.in_(job_ids))
+        .order_by(JobItem.job_id, JobItem.id)
     )
+    for job_id, name in rows:
+        names[job_id].append(name)
+    return names
 
-    url = f"{SORTLY_API_URL}?updated_since={updated_since}&per_page=100"
-    response = requests.get(url, headers=headers)
 
-    if response.status_code != 200:
-        print(f"❌ Sortly API error {response.status_code}: {response.text}")
-        return {"error": response.text}
+def _route_exits(db: Session, jobs, item_names, exits: list[str]) -> dict:
+    """
+    Consume each exit once, like the webhook path: it is deducted from the
+    newest job that matches it and still has some left, spilling over to
+    older jobs only for units the newer ones can't take (no commit).
+    Returns {job_id: [matched entries]}.
+    """
+    matched = {}
+    if not exits:
+        return matched
 
-    data = response.json().get("data", [])
-    matched = []
-    skipped = []
+    unique_exits = list(dict.fromkeys(exits))
+    counts = {}
+    for name in exits:
+        counts[name] = counts.get(name, 0) + 1
 
-    job_item_names = [i.name for i in job.items]
+    match_for = {}
+    for job in jobs:
+        if item_names[job.id]:
+            matcher = get_job_matcher(job.id, item_names[job.id])
+            match_for[job.id] = dict(zip(unique_exits, matcher.match_many(unique_exits)))
 
-    for item in data:
-        sortly_id = item.get("id")
-        name = item.get("name")
-        location = None
+    for name in unique_exits:
+        remaining = counts[name]
+        for job in sorted(jobs, key=lambda j: -j.id):
+            matched_name = match_for.get(job.id, {}).get(name)
+            if not matched_name:
+                continue
+            result = ledger.decrement_clamped(db, job.id, matched_name, remaining)
+            if result and result[0] != result[1]:
+                before, after = result
+                remaining -= before - after
+                matched.setdefault(job.id, []).append(
+                    {"name": matched_name, "deducted": before - after, "new_qty": after}
+                )
+            if remaining == 0:
+                break
+    return matched
 
-        # Extract location if available
-        if "location" in item and isinstance(item["location"], dict):
-            location = item["location"].get("name")
-        elif "parent" in item and isinstance(item["parent"], dict):
-            location = item["parent"].get("name")
 
-        # Skip folders (Sortly marks them differently)
-        if item.get("type") == "folder":
-            skipped.append(name)
-            continue
-
-        # Get or create cache record
-        cache = db.query(SortlyCache).filter(SortlyCache.sortly_id == sortly_id).first()
-        if not cache:
-            cache = SortlyCache(sortly_id=sortly_id, name=name, last_location=location)
-            db.add(cache)
+def _fetch_exits(db: Session, max_pages, max_items, deduct, renew=None):
+    """
+    Run the delta fetch, deducting exits page by page; returns
+    (exit count, report, error). On a mid-stream API failure the pages
+    already committed keep their deductions; the failed page is rolled back
+    and read again next run.
+    """
+    cursor = _DeltaCursor(db)
+    pager = ItemPager(
+        params={"updated_since": cursor.updated_since()}, max_pages=max_pages, max_items=max_items,
+        start_page=cursor.resume_page or 1,
+    )
+    skipped = []
+    stats = {"unchanged": 0, "exits": 0}
+    error = None
+    try:
+        _collect_exits(db, pager, cursor, deduct, skipped, stats, renew)
+        if not pager.truncated:
+            # Whole delta read: safe to jump to the highest mark whatever the order
+            cursor.complete()
             db.commit()
-            db.refresh(cache)
-
-        # Detect movement out of Warehouse
-        if cache.last_location == "Warehouse" and location and location != "Warehouse":
-            matched_name = fuzzy_match(name, job_item_names)
-            if matched_name:
-                job_item = (
-                    db.query(JobItem)
-                    .filter(JobItem.job_id == job_id, JobItem.name == matched_name)
-                    .first()
-                )
-                if job_item and job_item.current_qty > 0:
-                    job_item.current_qty -= 1
-                    db.commit()
-                    matched.append({"name": matched_name, "new_qty": job_item.current_qty})
-
-        # Update cache record regardless
-        cache.last_location = location
-        cache.last_seen = datetime.utcnow()
-        db.commit()
+    except sortly_client.RequestException as e:
+        db.rollback()
+        logger.error("sortly unreachable", extra={"error": str(e)})
+        error = str(e)
+    except SortlyAPIError as e:
+        db.rollback()
+        logger.error("sortly api error", extra={"status": e.status_code, "body": logs.payload_preview(e.text)})
+        error = e.text
 
-    return {
-        "job_id": job_id,
-        "matched": matched,
+    report = {
         "skipped": skipped,
+        "unchanged": stats["unchanged"],
+        "pagination": pager.report(),
+        "sync_state": cursor.report(),
+    }
+    return stats["exits"], report, error
+
+
+def _merge_matched(into: dict, matched: list[dict]):
+    """Fold one page's _route_exits() entries for a job into a per-name running total."""
+    for entry in matched:
+        total = into.setdefault(entry["name"], {"name": entry["name"], "deducted": 0})
+        total["deducted"] += entry["deducted"]
+        total["new_qty"] = entry["new_qty"]
+
+
+def run_full_sync(db: Session, max_pages=None, max_items=None, renew=None) -> dict:
+    """
+    Fetch the Sortly delta once and route each warehouse exit to one active
+    job (see _route_exits), page by page. Used by the scheduler and
+    GET /sortly/sync.
+    """
+    jobs = _active_jobs(db)
+    names = _job_item_names(db, [job.id for job in jobs])
+    matched = {job.id: {} for job in jobs}
+
+    def deduct(exits):
+        for job_id, entries in _route_exits(db, jobs, names, exits).items():
+            _merge_matched(matched[job_id], entries)
+
+    exit_count, report, error = _fetch_exits(db, max_pages, max_items, deduct, renew)
+    results = [
+        {"job_id": job.id, "job_name": job.name, "matched": list(matched[job.id].values())}
+        for job in jobs
+    ]
+
+    if error is not None:
+        return {"error": error, "jobs": results, "exits": exit_count, **report}
+
+    return {
+        "jobs": results,
+        "exits": exit_count,
+        **report,
         "timestamp": datetime.utcnow().isoformat()
     }
+
+
+def run_job_sync(db: Session, job_id: int, max_pages=None, max_items=None, renew=None) -> dict:
+    """
+    Run the full sync and report only one job's deductions. The delta and
+    its watermark are shared by every job, so reading it for a single job
+    would consume exits that belong to the others.
+    """
+    job = db.query(Job).filter(Job.id == job_id).first()
+    if not job:
+        return {"error": f"Job {job_id} not found"}
+
+    result = run_full_sync(db, max_pages=max_pages, max_items=max_items, renew=renew)
+    matched = next((entry["matched"] for entry in result.pop("jobs") if entry["job_id"] == job_id), [])
+    return {"job_id": job_id, "matched": matched, **result}
+
+
+def run_catalog_refresh(db: Session, max_items=None, renew=None) -> dict:
+    """Full catalog backfill into the local mirror (see app/catalog.py)."""
+    try:
+        return {**catalog.refresh(db, max_items=max_items, renew=renew), "timestamp": datetime.utcnow().isoformat()}
+    except sortly_client.RequestException as e:
+        db.rollback()
+        logger.error("sortly unreachable", extra={"error": str(e)})
+        return {"error": str(e)}
+    except SortlyAPIError as e:
+        db.rollback()
+        logger.error("sortly api error", extra={"status": e.status_code, "body": logs.payload_preview(e.text)})
+        return {"error": e.text}
+
+
+def _busy():
+    return {"status": "busy", "message": "A Sortly sync is already running", **sync_worker.sync_status()}
+
+
+@router.get("/sync")
+def sync_all_jobs(
+    max_pages: int | None = Query(None, ge=1),
+    max_items: int | None = Query(None, ge=1),
+):
+    """
+    Run a Sortly sync for every active job now. The background scheduler
+    already does this on an interval; this is the manual trigger.
+    """
+    result = sync_worker.run_locked(run_full_sync, max_pages=max_pages, max_items=max_items)
+    return _busy() if result is None else result
+
+
+@router.get("/sync/status")
+def sync_status():
+    """Last scheduled/manual sync: duration, items processed, error and lag."""
+    return sync_worker.sync_status()
+
+
+@router.get("/sync/{job_id}")
+def sync_with_sortly(
+    job_id: int,
+    max_pages: int | None = Query(None, ge=1),
+    max_items: int | None = Query(None, ge=1),
+):
+    """
+    Run the full Sortly sync (exits are routed across every active job) and
+    return what was deducted from this one.
+    """
+    result = sync_worker.run_locked(
+        run_job_sync, job_id=job_id, max_pages=max_pages, max_items=max_items
+    )
+    return _busy() if result is None else result
+
+
+@router.get("/locations")
+def cached_locations(refresh: bool = False):
+    """The cached Sortly location tree and its warehouse subtree."""
+    if refresh:
+        location_tree.invalidate()
+    return {"data": location_tree.locations(), **location_tree.report()}
+
+
+@router.get("/items")
+def search_items(
+    q: str | None = None,
+    location_id: int | None = None,
+    limit: int = Query(50, ge=1, le=500),
+    db: Session = Depends(get_db),
+):
+    """Name/SKU search over the local catalog mirror (no Sortly round trip)."""
+    items = catalog.search(db, q, location_id=location_id, limit=limit)
+    return {"data": [catalog.to_sortly(item) for item in items], "source": "mirror"}
+
+
+@router.post("/catalog/refresh")
+def refresh_catalog(max_items: int | None = Query(None, ge=1)):
+    """
+    Backfill the whole Sortly catalog into the local mirror. Runs under the
+    sync lease; the delta sync keeps the mirror current afterwards.
+    """
+    result = sync_worker.run_locked(run_catalog_refresh, max_items=max_items)
+    return _busy() if result is None else result
+
+
+@router.get("/writeback")
+def writeback_status():
+    """Quantities queued for Sortly: pending, in flight and parked after retries."""
+    return sortly_writeback.queue_stats()
+
+
+@router.post("/writeback/flush")
+def flush_writeback():
+    """Push due queued quantities to Sortly now instead of waiting for the interval."""
+    return sortly_writeback.flush()
@@ -1,34 +1,65 @@
 from fastapi import APIRouter, Request
+from sqlalchemy.orm import Session
 from datetime import datetime
-import os
+import hashlib
+import logging
 import json
 import math
 
-from app.database import get_db
-from app.models import Job
+from app import catalog, ledger, logs, webhook_queue
+from app.locations import location_tree
+from app.routing_index import routing_index
 
 router = APIRouter()
+logger = logging.getLogger(__name__)
 
-def _norm(s: str | None) -> str:
-    return (s or "").strip().lower()
+def _idempotency_key(data: dict, raw: bytes) -> str:
+    # Sortly retries resend the same transaction id; fall back to the exact bytes
+    body = data.get("body") or {}
+    txn_id = body.get("id") if isinstance(body, dict) else None
+    if txn_id is None:
+        txn_id = data.get("id")
+    if txn_id is not None:
+        return f"txn:{txn_id}"
+    return "sha256:" + hashlib.sha256(raw).hexdigest()
 
-def _warehouse_names() -> set[str]:
-    # Optional: WAREHOUSE_NAMES="Warehouse,Main Warehouse,WH"
-    raw = os.getenv("WAREHOUSE_NAMES", "Warehouse")
-    return {_norm(x) for x in raw.split(",") if x.strip()}
 
 @router.post("/sortly/webhook")
 async def handle_sortly_webhook(request: Request):
     """
-    Handle Sortly transaction webhooks (transaction.created).
-    Deduct quantity when an item move crosses the Warehouse boundary
-    (both directions: OUT of warehouse and INTO warehouse).
+    Accept Sortly transaction webhooks (transaction.created).
+    The event is validated, stored in the webhook inbox and acked at once;
+    apply_webhook_event() runs later in the background worker.
     """
     raw = await request.body()
     try:
         data = json.loads(raw)
-        print("\n🪵 RAW WEBHOOK PAYLOAD 🪵")
-        print(json.dumps(data, indent=2))
+    except ValueError as e:
+        logger.warning("webhook rejected", extra={"reason": "invalid JSON", "error": str(e), "bytes": len(raw)})
+        return {"status": "error", "message": "invalid JSON"}
+    if not isinstance(data, dict):
+        return {"status": "error", "message": "expected a JSON object"}
+
+    key = _idempotency_key(data, raw)
+    queued = await webhook_queue.enqueue(key, raw.decode("utf-8"))
+    return {"status": "queued" if queued else "duplicate", "key": key}
+
+
+@router.get("/sortly/webhook/queue")
+async def webhook_queue_status():
+    """Inbox depth by status (pending / processing / success / ...)."""
+    return await webhook_queue.queue_stats()
+
+
+def apply_webhook_event(db: Session, data: dict) -> dict:
+    """
+    Apply one queued Sortly event (caller commits).
+    Deduct quantity when an item move crosses the Warehouse boundary
+    (both directions: OUT of warehouse and INTO warehouse).
+    """
+    try:
+        if logger.isEnabledFor(logging.DEBUG) and logs.sample_payload():
+            logger.debug("webhook payload", extra={"payload": logs.payload_preview(data)})
 
         body = data.get("body", {}) or {}
         event_type = data.get("type", "unknown")
@@ -49,63 +80,68 @@ async def handle_sortly_webhook(request: Request):
 
         timestamp = data.get("time", datetime.utcnow().isoformat())
 
-        print(f"📦 Webhook received: {event_type} | {item_name} ({verb}) {old_location} → {new_location} ({deduct_amount})")
+        fields = {"event": event_type, "verb": verb, "item": item_name,
+                  "from": old_location, "to": new_location, "qty": deduct_amount}
+
+        # A folder was created, renamed or moved: the cached tree is stale
+        if node_type == "folder":
+            location_tree.invalidate()
 
         # Only item moves
         if event_type != "sortly.company.transaction.created" or verb != "move" or node_type != "item":
-            print("ℹ️ Ignored: not an item move event.")
+            logger.debug("webhook ignored", extra={**fields, "reason": "not an item move"})
             return {"status": "ignored", "event": event_type, "verb": verb, "node_type": node_type}
 
-        wh = _warehouse_names()
-        old_is_wh = _norm(old_location) in wh
-        new_is_wh = _norm(new_location) in wh
+        # Keep the catalog mirror's location current between syncs
+        catalog.record_move(db, body.get("node_id"), body.get("node_name"),
+                            body.get("node_parent_name"), body.get("node_parent_id"))
+
+        old_is_wh = location_tree.in_warehouse(body.get("old_parent_id"), old_location)
+        new_is_wh = location_tree.in_warehouse(body.get("node_parent_id"), new_location)
 
         # Only act when crossing the warehouse boundary (either direction)
         if not (old_is_wh ^ new_is_wh):
-            print("ℹ️ Not crossing warehouse boundary; no deduction.")
+            logger.debug("webhook ignored", extra={**fields, "reason": "no warehouse boundary crossing"})
             return {"status": "ignored", "note": "no warehouse boundary crossing"}
 
-        # Get most recent job
-        db = next(get_db())
-        job = db.query(Job).order_by(Job.id.desc()).first()
-        if not job:
-            print("⚠️ No active job found, skipping.")
-            return {"status": "ignored", "reason": "no active job"}
-
-        # Fuzzy match item within that job
-        target_item = None
-        item_name_n = _norm(item_name)
-        for i in job.items:
-            inorm = _norm(i.name)
-            if item_name_n == inorm or item_name_n in inorm or inorm in item_name_n:
-                target_item = i
+        # Route the item to every open job that lists it, newest job first
+        routes = routing_index.lookup(db, item_name)
+        if not routes:
+            logger.info("webhook skipped", extra={**fields, "reason": "no match"})
+            return {"status": "skipped", "reason": "no match", "item_name": item_name}
+
+        # Deduct for both directions (atomic, clamped at zero) from the
+        # newest job that still has some left
+        route = None
+        for candidate in routes:
+            result = ledger.decrement_clamped(db, candidate.job_id, candidate.item_name, deduct_amount)
+            if result and result[0] > 0:
+                route = candidate
+                before, after = result
                 break
 
-        if not target_item:
-            print(f"⚠️ No match found for item '{item_name}' in job '{job.name}'")
-            return {"status": "skipped", "reason": "no match", "item_name": item_name, "job": job.name}
-
-        # Deduct for both directions
-        before = target_item.current_qty or 0
-        after = max(0, before - deduct_amount)
-        target_item.current_qty = after
-        db.commit()
+        if route is None:
+            logger.info("webhook skipped", extra={**fields, "reason": "nothing left"})
+            return {"status": "skipped", "reason": "nothing left", "item_name": item_name}
 
         direction = "OUT_OF_WAREHOUSE" if (old_is_wh and not new_is_wh) else "INTO_WAREHOUSE"
-        print(f"✅ Deducted {deduct_amount} ({direction}) from '{target_item.name}' in job '{job.name}': {before} → {after}")
+        logger.info("webhook deducted", extra={
+            **fields, "direction": direction, "job_id": route.job_id,
+            "matched": route.item_name, "qty_before": before, "qty_after": after,
+        })
 
         return {
             "status": "success",
             "direction": direction,
-            "job_id": job.id,
-            "job_name": job.name,
-            "item": target_item.name,
-            "deducted": deduct_amount,
+            "job_id": route.job_id,
+            "job_name": route.job_name,
+            "item": route.item_name,
+            "deducted": before - after,
             "qty_before": before,
             "qty_after": after,
             "timestamp": timestamp,
         }
 
-    except Exception as e:
-        print(f"❌ Webhook error: {e}")
-        return {"status": "error", "message": str(e)}
+    except Exception:
+        logger.exception("webhook failed", extra={"event": data.get("type")})
+        raise
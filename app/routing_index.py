@@ -0,0 +1,136 @@
+import threading
+from collections import namedtuple
+
+from sqlalchemy import func
+
+from app.models import Job, JobItem
+from app.utils import normalize_name
+
+Route = namedtuple("Route", "job_id job_name item_id item_name")
+
+
+def _key(name: str) -> str:
+    return (name or "").lower().strip()
+
+
+def _stamp(db):
+    """(max id, row count) of job_items: changes whenever any process adds or deletes job items."""
+    return tuple(db.query(func.max(JobItem.id), func.count(JobItem.id)).one())
+
+
+class _PrefixIndex:
+    """key -> routes (newest job first), plus the distinct key lengths for prefix walks."""
+
+    def __init__(self):
+        self.by_key = {}
+        self.lengths = []
+
+    def add(self, key, route):
+        # Copy-on-write so concurrent lookups never see a half-sorted list
+        routes = sorted([*self.by_key.get(key, []), route], key=lambda r: -r.job_id)
+        self.by_key[key] = routes
+        if len(routes) == 1 and key:
+            self.lengths = sorted({*self.lengths, len(key)}, reverse=True)
+
+    def discard(self, key, route):
+        routes = [r for r in self.by_key.get(key, []) if r != route]
+        if routes:
+            self.by_key[key] = routes
+        else:
+            self.by_key.pop(key, None)
+            if not any(len(k) == len(key) for k in self.by_key):
+                self.lengths = [n for n in self.lengths if n != len(key)]
+
+    def find(self, key):
+        routes = self.by_key.get(key)
+        if routes:
+            return routes
+        # Sortly names like "HF-blue earplugs" still route to SKU "HF-blue"
+        for length in self.lengths:
+            if length < len(key):
+                routes = self.by_key.get(key[:length])
+                if routes:
+                    return routes
+        return []
+
+
+class RoutingIndex:
+    """
+    Process-wide map of Sortly item name -> job items that want it, across
+    every job (newest job first). Names are matched on their
+    lower-cased raw form (so ER-20 and ER-25 stay apart); the serial-stripped
+    form from normalize_name() is only a fallback. Lookups are a dict hit,
+    plus a short walk over distinct key lengths for names with extra text.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._exact = _PrefixIndex()
+        self._base = _PrefixIndex()
+        self._by_job = {}
+        self._stamp = None
+
+    def _add(self, route, exact=None, base=None):
+        (exact or self._exact).add(_key(route.item_name), route)
+        (base or self._base).add(normalize_name(route.item_name or ""), route)
+
+    def _discard(self, route):
+        self._exact.discard(_key(route.item_name), route)
+        self._base.discard(normalize_name(route.item_name or ""), route)
+
+    def rebuild(self, db, stamp=None):
+        """
+        Reload every job. Jobs with nothing left stay in: their quantities can
+        be raised again from another process without the stamp changing, and
+        the caller's clamped decrement skips them while they are empty.
+        """
+        stamp = stamp or _stamp(db)
+        rows = (
+            db.query(Job.id, Job.name, JobItem.id, JobItem.name)
+            .join(JobItem, JobItem.job_id == Job.id)
+            .all()
+        )
+        by_job = {}
+        for job_id, job_name, item_id, item_name in rows:
+            by_job.setdefault(job_id, []).append(Route(job_id, job_name, item_id, item_name))
+        exact, base = _PrefixIndex(), _PrefixIndex()
+        for routes in by_job.values():
+            for route in routes:
+                self._add(route, exact, base)
+        with self._lock:
+            self._exact, self._base = exact, base
+            self._by_job = by_job
+            self._stamp = stamp
+
+    def set_job(self, job_id: int, job_name: str, items):
+        """Replace one job's routes; `items` is [(item_id, item_name), ...]."""
+        routes = [Route(job_id, job_name, i, n) for i, n in items]
+        with self._lock:
+            for route in self._by_job.pop(job_id, []):
+                self._discard(route)
+            for route in routes:
+                self._add(route)
+            self._by_job[job_id] = routes
+
+    def remove_job(self, job_id: int):
+        with self._lock:
+            for route in self._by_job.pop(job_id, []):
+                self._discard(route)
+
+    def _find(self, name: str):
+        return self._exact.find(_key(name)) or self._base.find(normalize_name(name or ""))
+
+    def lookup(self, db, name: str):
+        """
+        Candidate routes for a Sortly item name, newest job first. Confirmed
+        against job_items with one aggregate over the primary key: if any
+        process added or deleted job items since the last build, rebuild
+        before answering, so a miss or an older-job hit is never stale.
+        """
+        stamp = _stamp(db)
+        if stamp != self._stamp:
+            self.rebuild(db, stamp)
+        return list(self._find(name))
+
+
+routing_index = RoutingIndex()
@@ -1,65 +1,84 @@
 import os
-import requests
-from dotenv import load_dotenv
 
-load_dotenv()
+from app import catalog, sortly_client, sortly_writeback
+from app.locations import location_tree
+from app.database import SessionLocal
 
+# Settings come from the environment (main.py loads .env once). A missing
+# SORTLY_SECRET_KEY is reported on the first Sortly call, not at import.
 SORTLY_PUBLIC_KEY = os.getenv("SORTLY_PUBLIC_KEY")
 SORTLY_SECRET_KEY = os.getenv("SORTLY_SECRET_KEY")
-SORTLY_BASE_URL = os.getenv("SORTLY_BASE_URL", "https://api.sortly.co/api/v1")
+SORTLY_BASE_URL = sortly_client.SORTLY_BASE_URL
 
-if not SORTLY_SECRET_KEY:
-    raise ValueError("Missing Sortly API credentials in .env")
-
-HEADERS = {
-    "Authorization": f"Bearer {SORTLY_SECRET_KEY}",
-    "Accept": "application/json",
-    "Content-Type": "application/json"
-}
-
-def get_locations():
-    """Fetch all locations from Sortly."""
-    url = f"{SORTLY_BASE_URL}/locations"
-    res = requests.get(url, headers=HEADERS)
+def get_locations(live=False):
+    """All Sortly locations, from the TTL-cached tree unless live=True."""
+    if not live:
+        locations = location_tree.locations()
+        if locations:
+            return {"data": locations, "source": "cache"}
+    res = sortly_client.get("/locations")
     if res.status_code != 200:
         raise Exception(f"Sortly API error: {res.status_code} - {res.text}")
     return res.json()
 
-def get_items(location_id=None, name_query=None):
-    """Fetch items (optionally filtered by location or name)."""
-    url = f"{SORTLY_BASE_URL}/items"
+def _from_mirror(query=None, location_id=None, limit=100):
+    """Sortly-shaped /items response from the local mirror, or None if it has nothing."""
+    db = SessionLocal()
+    try:
+        items = catalog.search(db, query, location_id=location_id, limit=limit)
+        return {"data": [catalog.to_sortly(item) for item in items], "source": "mirror"} if items else None
+    finally:
+        db.close()
+
+def get_items(location_id=None, name_query=None, live=False):
+    """
+    Fetch items (optionally filtered by location or name).
+    Served from the local catalog mirror; Sortly is only asked when the
+    mirror has no match (or live=True).
+    """
+    if not live:
+        local = _from_mirror(name_query, location_id)
+        if local is not None:
+            return local
     params = {}
     if location_id:
         params["filter[location_id]"] = location_id
     if name_query:
         params["filter[name]"] = name_query
-    res = requests.get(url, headers=HEADERS, params=params)
+    res = sortly_client.get("/items", params=params)
     if res.status_code != 200:
         raise Exception(f"Sortly API error: {res.status_code} - {res.text}")
     return res.json()
 
-def search_item_by_name(item_name):
-    """Search Sortly by item name."""
-    url = f"{SORTLY_BASE_URL}/items"
+def search_item_by_name(item_name, live=False):
+    """Search by item name or SKU: local mirror first, live Sortly as fallback."""
+    if not live:
+        local = _from_mirror(item_name)
+        if local is not None:
+            return local
     params = {"filter[name]": item_name}
-    res = requests.get(url, headers=HEADERS, params=params)
+    res = sortly_client.get("/items", params=params)
     if res.status_code != 200:
         raise Exception(f"Sortly API error: {res.status_code} - {res.text}")
     return res.json()
 
-def deduct_item_quantity(item_id, new_quantity):
-    """Update Sortly item quantity."""
-    url = f"{SORTLY_BASE_URL}/items/{item_id}"
+def deduct_item_quantity(item_id, new_quantity, defer=False):
+    """
+    Update Sortly item quantity. With defer=True the write goes through the
+    coalescing write-behind queue (app/sortly_writeback.py) instead.
+    """
+    if defer:
+        sortly_writeback.queue_quantity(item_id, new_quantity)
+        return True
     data = {"quantity": new_quantity}
-    res = requests.put(url, headers=HEADERS, json=data)
+    res = sortly_client.put(f"/items/{item_id}", json=data)
     if res.status_code not in (200, 204):
         raise Exception(f"Sortly API error: {res.status_code} - {res.text}")
     return True
 
 def test_sortly_connection():
     """Quick connectivity test."""
-    url = f"{SORTLY_BASE_URL}/items"
-    res = requests.get(url, headers=HEADERS)
+    res = sortly_client.get("/items")
     if res.status_code == 200:
         print("✅ Sortly API connected successfully!")
         print(res.json())
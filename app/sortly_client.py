@@ -0,0 +1,140 @@
+import os
+import re
+import threading
+import time
+
+from app import metrics
+
+SORTLY_BASE_URL = os.getenv("SORTLY_BASE_URL", "https://api.sortly.co/api/v1").rstrip("/")
+
+# Tunables (seconds / counts) — override in .env if Sortly is slow or flaky
+SORTLY_CONNECT_TIMEOUT = float(os.getenv("SORTLY_CONNECT_TIMEOUT", "5"))
+SORTLY_READ_TIMEOUT = float(os.getenv("SORTLY_READ_TIMEOUT", "30"))
+SORTLY_MAX_RETRIES = int(os.getenv("SORTLY_MAX_RETRIES", "3"))
+SORTLY_BACKOFF_FACTOR = float(os.getenv("SORTLY_BACKOFF_FACTOR", "0.5"))
+SORTLY_POOL_SIZE = int(os.getenv("SORTLY_POOL_SIZE", "10"))
+
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+_session = None
+_session_lock = threading.Lock()
+
+_timings = {}
+_timings_lock = threading.Lock()
+
+
+def __getattr__(name):
+    # requests is imported with the first session; exception handlers can
+    # still name sortly_client.RequestException without importing it at boot
+    if name == "RequestException":
+        import requests
+        return requests.RequestException
+    raise AttributeError(name)
+
+
+def _build_session():
+    import requests
+    from requests.adapters import HTTPAdapter
+    from urllib3.util.retry import Retry
+
+    secret_key = os.getenv("SORTLY_SECRET_KEY")
+    if not secret_key:
+        raise ValueError("Missing Sortly API credentials in .env")
+    retry = Retry(
+        total=SORTLY_MAX_RETRIES,
+        backoff_factor=SORTLY_BACKOFF_FACTOR,
+        status_forcelist=RETRY_STATUSES,
+        allowed_methods=frozenset({"GET", "PUT"}),  # both idempotent for Sortly
+        respect_retry_after_header=True,
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(
+        pool_connections=SORTLY_POOL_SIZE,
+        pool_maxsize=SORTLY_POOL_SIZE,
+        max_retries=retry,
+    )
+    session = requests.Session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.headers.update({
+        "Authorization": f"Bearer {secret_key}",
+        "Accept": "application/json",
+        "Content-Type": "application/json",
+    })
+    return session
+
+
+def get_session():
+    """Return the process-wide pooled keep-alive session (built on first use)."""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                _session = _build_session()
+    return _session
+
+
+def _endpoint_label(method: str, path: str) -> str:
+    # Collapse ids so /items/123 and /items/456 share one counter
+    return method + " " + re.sub(r"/\d+", "/{id}", path)
+
+
+def _record(label: str, elapsed_ms: float, status):
+    with _timings_lock:
+        t = _timings.setdefault(label, {
+            "calls": 0, "errors": 0, "total_ms": 0.0, "max_ms": 0.0, "last_status": None,
+        })
+        t["calls"] += 1
+        t["total_ms"] += elapsed_ms
+        t["max_ms"] = max(t["max_ms"], elapsed_ms)
+        t["last_status"] = status
+        if status is None or status >= 400:
+            t["errors"] += 1
+
+
+def request(method: str, path: str, *, params=None, json=None, timeout=None):
+    """
+    Send a request to the Sortly API over the shared session.
+    `path` is relative to SORTLY_BASE_URL (e.g. "/items").
+    Transient 5xx/429 responses are retried with backoff before returning.
+    """
+    url = f"{SORTLY_BASE_URL}/{path.lstrip('/')}"
+    label = _endpoint_label(method, "/" + path.lstrip("/"))
+    start = time.perf_counter()
+    status = None
+    try:
+        res = get_session().request(
+            method,
+            url,
+            params=params,
+            json=json,
+            timeout=timeout or (SORTLY_CONNECT_TIMEOUT, SORTLY_READ_TIMEOUT),
+        )
+        status = res.status_code
+        return res
+    finally:
+        elapsed = time.perf_counter() - start
+        _record(label, elapsed * 1000, status)
+        metrics.observe_sortly(label, elapsed, status)
+
+
+def get(path: str, **kwargs):
+    return request("GET", path, **kwargs)
+
+
+def put(path: str, **kwargs):
+    return request("PUT", path, **kwargs)
+
+
+def get_timings() -> dict:
+    """Snapshot of per-endpoint call counters (calls, errors, total/avg/max ms)."""
+    with _timings_lock:
+        return {
+            label: {**t, "avg_ms": round(t["total_ms"] / t["calls"], 2) if t["calls"] else 0.0}
+            for label, t in _timings.items()
+        }
+
+
+def reset_timings():
+    with _timings_lock:
+        _timings.clear()
@@ -0,0 +1,88 @@
+import os
+
+from app import sortly_client
+
+# Per-run safety budget so one huge delta can't pin a sync request forever
+SORTLY_PAGE_SIZE = int(os.getenv("SORTLY_PAGE_SIZE", "100"))
+SORTLY_SYNC_MAX_PAGES = int(os.getenv("SORTLY_SYNC_MAX_PAGES", "50"))
+SORTLY_SYNC_MAX_ITEMS = int(os.getenv("SORTLY_SYNC_MAX_ITEMS", "5000"))
+
+
+class SortlyAPIError(Exception):
+    def __init__(self, status_code: int, text: str):
+        super().__init__(f"Sortly API error: {status_code} - {text}")
+        self.status_code = status_code
+        self.text = text
+
+
+class ItemPager:
+    """
+    Lazily walks Sortly's paginated /items endpoint.
+
+    Iterate it for items (or call iter_pages() for whole pages); only one page is
+    held in memory at a time. After iteration, `pages`, `items` and
+    `truncated` report what was consumed and whether a budget cut it short.
+    `resume_page` is the page to start from to continue (None once the last
+    page has been read); it is already current while a page is being handled.
+    """
+
+    def __init__(self, params=None, per_page=None, max_pages=None, max_items=None, start_page=1):
+        self.params = dict(params or {})
+        self.per_page = per_page or SORTLY_PAGE_SIZE
+        self.max_pages = max_pages or SORTLY_SYNC_MAX_PAGES
+        self.max_items = max_items or SORTLY_SYNC_MAX_ITEMS
+        self.pages = 0
+        self.items = 0
+        self.truncated = False
+        self.start_page = start_page
+        self.resume_page = start_page
+
+    def iter_pages(self):
+        page = self.start_page
+        while True:
+            if self.pages >= self.max_pages or self.items >= self.max_items:
+                self.truncated = True
+                self.resume_page = page
+                return
+
+            res = sortly_client.get(
+                "/items", params={**self.params, "page": page, "per_page": self.per_page}
+            )
+            if res.status_code != 200:
+                raise SortlyAPIError(res.status_code, res.text)
+
+            body = res.json()
+            data = body.get("data", [])
+            room = self.max_items - self.items
+            if len(data) > room:
+                data = data[:room]
+                self.truncated = True
+
+            self.pages += 1
+            self.items += len(data)
+
+            # Prefer Sortly's own cursor; fall back to "full page means more"
+            meta = body.get("meta") or {}
+            next_page = meta.get("next_page")
+            if self.truncated:
+                next_page = page  # cut mid-page: re-read it
+            elif next_page:
+                next_page = int(next_page)
+            elif "next_page" in meta or len(data) < self.per_page:
+                next_page = None
+            else:
+                next_page = page + 1
+            self.resume_page = next_page
+
+            if data:
+                yield data
+            if self.truncated or next_page is None:
+                return
+            page = next_page
+
+    def __iter__(self):
+        for data in self.iter_pages():
+            yield from data
+
+    def report(self) -> dict:
+        return {"pages": self.pages, "items": self.items, "truncated": self.truncated}
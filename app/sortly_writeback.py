@@ -0,0 +1,214 @@
+import logging
+import os
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from sqlalchemy import delete, event, func, or_, update
+from sqlalchemy.orm import Session
+
+from app import sortly_client
+from app.claim_queue import ClaimQueue, claim
+from app.database import SessionLocal, bulk_upsert
+from app.models import SortlyItem, SortlyPendingWrite
+
+logger = logging.getLogger(__name__)
+
+# Flush every N seconds, or as soon as this many writes are waiting
+WRITEBACK_FLUSH_INTERVAL = float(os.getenv("WRITEBACK_FLUSH_INTERVAL", "2.0"))
+WRITEBACK_FLUSH_SIZE = int(os.getenv("WRITEBACK_FLUSH_SIZE", "50"))
+# Items claimed per flush, and PUTs in flight at once (keep <= SORTLY_POOL_SIZE)
+WRITEBACK_BATCH_SIZE = int(os.getenv("WRITEBACK_BATCH_SIZE", "200"))
+WRITEBACK_CONCURRENCY = int(os.getenv("WRITEBACK_CONCURRENCY", "4"))
+# Failed writes back off exponentially and are parked after this many tries
+WRITEBACK_MAX_ATTEMPTS = int(os.getenv("WRITEBACK_MAX_ATTEMPTS", "10"))
+WRITEBACK_RETRY_BASE = 5.0
+WRITEBACK_RETRY_MAX = 600.0
+# Claims older than this are assumed to belong to a crashed worker
+WRITEBACK_CLAIM_TIMEOUT = timedelta(seconds=int(os.getenv("WRITEBACK_CLAIM_TIMEOUT", "300")))
+
+_queue = ClaimQueue("sortly_writeback")
+_unflushed = 0
+_unflushed_lock = threading.Lock()
+
+
+def notify():
+    """Wake the flusher early (safe to call from any thread)."""
+    _queue.notify()
+
+
+def _after_commit(session):
+    global _unflushed
+    queued = session.info.pop("writeback_queued", 0)
+    with _unflushed_lock:
+        _unflushed += queued
+        full = _unflushed >= WRITEBACK_FLUSH_SIZE
+    if full:
+        notify()
+
+
+def enqueue(db: Session, sortly_id: int, quantity):
+    """
+    Queue "set Sortly item `sortly_id` to `quantity`" (caller commits).
+    A pending write for the same item is replaced, not added to.
+    """
+    now = datetime.utcnow()
+    row = {"sortly_id": sortly_id, "quantity": quantity, "version": 1, "attempts": 0,
+           "next_attempt_at": now, "created_at": now, "updated_at": now}
+    bulk_upsert(
+        db, SortlyPendingWrite, [row],
+        conflict_cols=["sortly_id"],
+        update_cols=["quantity"],
+        set_={
+            "version": SortlyPendingWrite.version + 1,
+            "attempts": 0,
+            "next_attempt_at": now,
+            "last_error": None,
+            "updated_at": now,
+        },
+    )
+
+    # Count toward the size threshold once the caller's transaction commits
+    if "writeback_queued" not in db.info:
+        event.listen(db, "after_commit", _after_commit, once=True)
+    db.info["writeback_queued"] = db.info.get("writeback_queued", 0) + 1
+
+
+def queue_quantity(sortly_id: int, quantity):
+    """enqueue() in its own transaction."""
+    db = SessionLocal()
+    try:
+        enqueue(db, sortly_id, quantity)
+        db.commit()
+    finally:
+        db.close()
+
+
+def _claimable(now):
+    return (
+        SortlyPendingWrite.next_attempt_at <= now,
+        SortlyPendingWrite.attempts < WRITEBACK_MAX_ATTEMPTS,
+        or_(
+            SortlyPendingWrite.claimed_by.is_(None),
+            SortlyPendingWrite.claimed_at < now - WRITEBACK_CLAIM_TIMEOUT,
+        ),
+    )
+
+
+def _claim(db, worker_id: str) -> list:
+    """
+    Claim up to WRITEBACK_BATCH_SIZE due writes for `worker_id`. The
+    transaction is ended before returning, so no connection sits idle in
+    transaction while the PUTs run.
+    """
+    now = datetime.utcnow()
+    key = SortlyPendingWrite.sortly_id
+    if not claim(db, SortlyPendingWrite, key, _claimable(now), SortlyPendingWrite.next_attempt_at,
+                 WRITEBACK_BATCH_SIZE, worker_id):
+        return []
+    writes = (
+        db.query(key, SortlyPendingWrite.quantity, SortlyPendingWrite.version)
+        .filter(SortlyPendingWrite.claimed_by == worker_id)
+        .all()
+    )
+    db.commit()
+    return writes
+
+
+def _push(write):
+    """PUT one quantity; returns (write, error, retryable)."""
+    sortly_id, quantity, _ = write
+    try:
+        # sortly_client already retries 429/5xx with backoff inside this call
+        res = sortly_client.put(f"/items/{sortly_id}", json={"quantity": quantity})
+    except sortly_client.RequestException as e:
+        return write, str(e), True
+    if res.status_code in (200, 204):
+        return write, None, False
+    retryable = res.status_code in (408, 409, 429) or res.status_code >= 500
+    return write, f"{res.status_code} - {res.text[:200]}", retryable
+
+
+def _backoff(attempts: int) -> timedelta:
+    return timedelta(seconds=min(WRITEBACK_RETRY_BASE * 2 ** attempts, WRITEBACK_RETRY_MAX))
+
+
+def flush() -> dict:
+    """
+    Claim due writes, PUT them with at most WRITEBACK_CONCURRENCY in
+    flight, then drop the ones Sortly accepted and reschedule the rest.
+    """
+    global _unflushed
+    with _unflushed_lock:
+        _unflushed = 0
+    worker_id = uuid.uuid4().hex
+    db = SessionLocal()
+    try:
+        writes = _claim(db, worker_id)
+        if not writes:
+            return {"claimed": 0, "pushed": 0, "failed": 0}
+        with ThreadPoolExecutor(max_workers=min(WRITEBACK_CONCURRENCY, len(writes))) as pool:
+            results = list(pool.map(_push, writes))
+
+        now = datetime.utcnow()
+        pushed = failed = 0
+        for (sortly_id, quantity, version), error, retryable in results:
+            # Only touch the row if no newer quantity was queued meanwhile
+            current = (SortlyPendingWrite.sortly_id == sortly_id, SortlyPendingWrite.version == version)
+            if error is None:
+                pushed += 1
+                db.execute(delete(SortlyPendingWrite).where(*current))
+                db.execute(
+                    update(SortlyItem).where(SortlyItem.sortly_id == sortly_id).values(quantity=quantity)
+                )
+                continue
+            failed += 1
+            row = db.get(SortlyPendingWrite, sortly_id)
+            attempts = (row.attempts if row else 0) + 1
+            db.execute(
+                update(SortlyPendingWrite).where(*current).values(
+                    attempts=attempts if retryable else WRITEBACK_MAX_ATTEMPTS,
+                    next_attempt_at=now + _backoff(attempts),
+                    last_error=error,
+                )
+            )
+            logger.warning("sortly write failed", extra={
+                "sortly_id": sortly_id, "quantity": quantity, "attempt": attempts,
+                "retryable": retryable, "error": error,
+            })
+        db.execute(
+            update(SortlyPendingWrite)
+            .where(SortlyPendingWrite.claimed_by == worker_id)
+            .values(claimed_by=None, claimed_at=None)
+        )
+        db.commit()
+        return {"claimed": len(writes), "pushed": pushed, "failed": failed}
+    finally:
+        db.close()
+
+
+def queue_stats() -> dict:
+    """Pending, in-flight and parked (gave up retrying) write counts."""
+    db = SessionLocal()
+    try:
+        parked = SortlyPendingWrite.attempts >= WRITEBACK_MAX_ATTEMPTS
+        total, parked_count, claimed, oldest = db.query(
+            func.count(SortlyPendingWrite.sortly_id),
+            func.count(SortlyPendingWrite.sortly_id).filter(parked),
+            func.count(SortlyPendingWrite.claimed_by),
+            func.min(SortlyPendingWrite.created_at),
+        ).one()
+        return {
+            "pending": total - parked_count,
+            "in_flight": claimed,
+            "parked": parked_count,
+            "oldest": oldest.isoformat() if oldest else None,
+        }
+    finally:
+        db.close()
+
+
+async def run_worker():
+    """Flush on an interval (or early when the size threshold is hit) until cancelled."""
+    await _queue.run(lambda: flush()["claimed"], WRITEBACK_BATCH_SIZE, WRITEBACK_FLUSH_INTERVAL)
@@ -0,0 +1,35 @@
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class BootTimer:
+    """Wall time per startup phase, from process import to serving."""
+
+    def __init__(self):
+        self.started = None
+        self.phases = {}
+        self._last = None
+        self.total_ms = None
+
+    def start(self, at=None):
+        self.started = self._last = at if at is not None else time.perf_counter()
+
+    def mark(self, phase: str):
+        now = time.perf_counter()
+        if self._last is None:
+            self.start(now)
+        self.phases[phase] = round((now - self._last) * 1000, 1)
+        self._last = now
+
+    def finish(self):
+        self.mark("lifespan")
+        self.total_ms = round((self._last - self.started) * 1000, 1)
+        logger.info("startup complete", extra=self.report())
+
+    def report(self) -> dict:
+        return {"total_ms": self.total_ms, "phases_ms": dict(self.phases)}
+
+
+boot = BootTimer()
@@ -0,0 +1,174 @@
+import asyncio
+import functools
+import logging
+import os
+import time
+import uuid
+from datetime import datetime, timedelta
+
+from sqlalchemy import or_, update
+from sqlalchemy.exc import IntegrityError
+
+from app import metrics
+from app.database import SessionLocal
+from app.models import SyncLease
+
+logger = logging.getLogger(__name__)
+
+SORTLY_SYNC_LEASE = "sortly_sync"
+# Seconds between background syncs; 0 turns the scheduler off
+SORTLY_SYNC_INTERVAL = float(os.getenv("SORTLY_SYNC_INTERVAL", "30"))
+# A holder that dies mid-run blocks others for at most this long
+SORTLY_SYNC_LEASE_SECONDS = int(os.getenv("SORTLY_SYNC_LEASE_SECONDS", "300"))
+
+
+def acquire_lease(name: str, holder: str, ttl_seconds: int) -> bool:
+    """Take the named lease if it is free or expired. Never blocks."""
+    db = SessionLocal()
+    try:
+        if db.get(SyncLease, name) is None:
+            try:
+                db.add(SyncLease(name=name))
+                db.commit()
+            except IntegrityError:
+                db.rollback()  # another worker created it first
+
+        now = datetime.utcnow()
+        taken = db.execute(
+            update(SyncLease)
+            .where(
+                SyncLease.name == name,
+                or_(SyncLease.holder.is_(None), SyncLease.expires_at < now),
+            )
+            .values(
+                holder=holder,
+                expires_at=now + timedelta(seconds=ttl_seconds),
+                last_started_at=now,
+            )
+        ).rowcount
+        db.commit()
+        return taken == 1
+    finally:
+        db.close()
+
+
+class LeaseLost(Exception):
+    """The lease expired and another worker took it; the run must stop."""
+
+
+def renew_lease(db, name: str, holder: str, ttl_seconds: int):
+    """
+    Push the lease's expiry out again, inside the caller's transaction (the
+    caller commits). Raises LeaseLost if `holder` no longer holds it.
+    """
+    renewed = db.execute(
+        update(SyncLease)
+        .where(SyncLease.name == name, SyncLease.holder == holder)
+        .values(expires_at=datetime.utcnow() + timedelta(seconds=ttl_seconds))
+    ).rowcount
+    if renewed != 1:
+        raise LeaseLost(name)
+
+
+def release_lease(name: str, holder: str, **status):
+    """Free the lease and record how the run went."""
+    db = SessionLocal()
+    try:
+        db.execute(
+            update(SyncLease)
+            .where(SyncLease.name == name, SyncLease.holder == holder)
+            .values(holder=None, expires_at=None, **status)
+        )
+        db.commit()
+    finally:
+        db.close()
+
+
+def run_locked(sync_fn, **kwargs):
+    """
+    Run `sync_fn(db, renew=..., **kwargs)` under the Sortly sync lease.
+    sync_fn calls renew(db) before each commit, which keeps the lease alive
+    for long runs and aborts the run (LeaseLost) if it was lost anyway.
+    Returns its result dict, or None if another worker is already syncing.
+    """
+    holder = uuid.uuid4().hex
+    if not acquire_lease(SORTLY_SYNC_LEASE, holder, SORTLY_SYNC_LEASE_SECONDS):
+        return None
+
+    start = time.perf_counter()
+    result = {}
+    error = None
+    renew = functools.partial(
+        renew_lease, name=SORTLY_SYNC_LEASE, holder=holder, ttl_seconds=SORTLY_SYNC_LEASE_SECONDS
+    )
+    db = SessionLocal()
+    try:
+        result = sync_fn(db, renew=renew, **kwargs)
+        error = result.get("error")
+        return result
+    except LeaseLost:
+        db.rollback()
+        error = "sync lease lost to another worker; run stopped"
+        logger.warning("sortly sync stopped", extra={"reason": "lease lost"})
+        result = {"error": error}
+        return result
+    except Exception as e:
+        error = str(e)
+        raise
+    finally:
+        db.close()
+        finished = datetime.utcnow()
+        elapsed = time.perf_counter() - start
+        metrics.observe_sync(elapsed, error)
+        status = {
+            "last_finished_at": finished,
+            "last_duration_ms": int(elapsed * 1000),
+            "last_items": (result.get("pagination") or {}).get("items"),
+            "last_exits": result.get("exits"),
+            "last_error": error,
+        }
+        if error is None:
+            status["last_success_at"] = finished
+        release_lease(SORTLY_SYNC_LEASE, holder, **status)
+
+
+def sync_status() -> dict:
+    db = SessionLocal()
+    try:
+        lease = db.get(SyncLease, SORTLY_SYNC_LEASE)
+    finally:
+        db.close()
+
+    now = datetime.utcnow()
+    if lease is None:
+        return {"running": False, "interval_seconds": SORTLY_SYNC_INTERVAL, "last_run": None}
+    return {
+        "running": lease.holder is not None and lease.expires_at is not None and lease.expires_at > now,
+        "interval_seconds": SORTLY_SYNC_INTERVAL,
+        "last_run": {
+            "started_at": lease.last_started_at,
+            "finished_at": lease.last_finished_at,
+            "duration_ms": lease.last_duration_ms,
+            "items_processed": lease.last_items,
+            "exits": lease.last_exits,
+            "error": lease.last_error,
+        },
+        "last_success_at": lease.last_success_at,
+        # How stale our view of Sortly is
+        "lag_seconds": (now - lease.last_success_at).total_seconds() if lease.last_success_at else None,
+    }
+
+
+async def run_worker(sync_fn):
+    """Sync on a fixed interval until cancelled; each run is single-flight."""
+    if SORTLY_SYNC_INTERVAL <= 0:
+        return
+    while True:
+        started = time.monotonic()
+        try:
+            result = await asyncio.to_thread(run_locked, sync_fn)
+            if result is None:
+                logger.info("sortly sync skipped", extra={"reason": "lease held"})
+        except Exception:
+            logger.exception("scheduled sortly sync failed")
+        await asyncio.sleep(max(0.0, SORTLY_SYNC_INTERVAL - (time.monotonic() - started)))
@@ -1,5 +1,10 @@
 import re
-from rapidfuzz import process, fuzz
+import threading
+
+FUZZY_SCORE_CUTOFF = 70
+
+_SERIAL_SUFFIX = re.compile(r'-\d+.*$')
+
 
 def normalize_name(name: str) -> str:
     """
@@ -9,28 +14,113 @@ def normalize_name(name: str) -> str:
     """
     name = name.lower().strip()
     # Remove long numeric or serial suffixes (e.g. -123456 or -122025-1)
-    name = re.sub(r'-\d+.*$', '', name)
+    name = _SERIAL_SUFFIX.sub('', name)
     return name
 
 
-def fuzzy_match(scan_name: str, job_items):
+class SkuMatcher:
     """
-    Match a scanned barcode against job item SKUs.
-    - Direct prefix match if scan starts with SKU
-    - Otherwise fuzzy match using RapidFuzz
+    Precompiled matcher for one job's SKUs.
+    Lower-cases the job item names once and keeps a prefix index on them.
+    SKUs are never suffix-stripped (ER-20 and ER-25 must stay apart); only
+    the scanned name is, as a second try after the name as scanned.
     """
-    scan_clean = normalize_name(scan_name)
-    item_names = [normalize_name(i.name) for i in job_items]
 
-    # 1. Direct prefix match (fast + accurate for SKUs like HF-blue-123)
-    for original, normalized in zip(job_items, item_names):
-        if scan_clean.startswith(normalized):
-            return original.name
+    def __init__(self, names):
+        self.names = tuple(names)
+        self.keys = [n.lower().strip() for n in self.names]
+        # lower-cased SKU -> first position in the job (job order breaks ties)
+        self._prefix_index = {}
+        for pos, key in enumerate(self.keys):
+            self._prefix_index.setdefault(key, pos)
+        self._prefix_lengths = sorted({len(k) for k in self._prefix_index})
+
+    def _prefix_match(self, scan_key: str):
+        # Longest SKU wins, so "ER-25-0042" picks ER-25 over ER
+        for length in reversed(self._prefix_lengths):
+            if length <= len(scan_key):
+                pos = self._prefix_index.get(scan_key[:length])
+                if pos is not None:
+                    return pos
+        return None
+
+    def match(self, scan_name: str):
+        """
+        Match a scanned barcode against job item SKUs.
+        - Exact (case-insensitive) SKU
+        - Direct prefix match if the scan, or the scan without its serial
+          suffix, starts with a SKU
+        - Otherwise fuzzy match using RapidFuzz
+        """
+        return self.match_many([scan_name])[0]
+
+    def match_many(self, scan_names):
+        """
+        Match many names at once; returns a list of job item names (or None).
+        Prefix hits are resolved from the index, the rest go through a
+        single RapidFuzz cdist call instead of one extractOne per name.
+        """
+        results = [None] * len(scan_names)
+        if not self.names:
+            return results
+
+        pending = []
+        for i, scan_name in enumerate(scan_names):
+            scan_key = scan_name.lower().strip()
+            pos = self._prefix_index.get(scan_key)
+            if pos is None:
+                pos = self._prefix_match(scan_key)
+            if pos is None:
+                pos = self._prefix_match(normalize_name(scan_name))
+            if pos is not None:
+                results[i] = self.names[pos]
+            else:
+                pending.append((i, scan_key))
+
+        if pending:
+            # Imported on first fuzzy lookup, not at boot (pulls in numpy)
+            from rapidfuzz import fuzz, process
+
+            scores = process.cdist(
+                [key for _, key in pending],
+                self.keys,
+                scorer=fuzz.token_sort_ratio,
+                score_cutoff=FUZZY_SCORE_CUTOFF,
+                workers=-1,
+            )
+            best = scores.argmax(axis=1)
+            for row, (i, _) in enumerate(pending):
+                col = best[row]
+                if scores[row, col] >= FUZZY_SCORE_CUTOFF:
+                    results[i] = self.names[col]
 
-    # 2. Fallback fuzzy match
-    match, score, _ = process.extractOne(scan_clean, item_names, scorer=fuzz.token_sort_ratio)
-    if score >= 70:
-        index = item_names.index(match)
-        return job_items[index].name
+        return results
 
-    return None
+
+# Per-job matcher cache. A matcher is reused while the job's item names are
+# unchanged; job routes also drop it explicitly when items are edited.
+_job_matchers = {}
+_job_matchers_lock = threading.Lock()
+
+
+def get_job_matcher(job_id: int, names) -> SkuMatcher:
+    names = tuple(names)
+    matcher = _job_matchers.get(job_id)
+    if matcher is None or matcher.names != names:
+        matcher = SkuMatcher(names)
+        with _job_matchers_lock:
+            _job_matchers[job_id] = matcher
+    return matcher
+
+
+def invalidate_job_matcher(job_id: int):
+    with _job_matchers_lock:
+        _job_matchers.pop(job_id, None)
+
+
+def fuzzy_match(scan_name: str, job_items):
+    """
+    Match a scanned barcode against job item SKUs.
+    One-off convenience wrapper; hot paths should use get_job_matcher().
+    """
+    return SkuMatcher([i.name for i in job_items]).match(scan_name)
@@ -0,0 +1,144 @@
+import asyncio
+import json
+import logging
+import os
+import uuid
+from datetime import datetime, timedelta
+
+from sqlalchemy import select, update, delete, func
+from sqlalchemy.exc import IntegrityError
+
+from app.claim_queue import ClaimQueue, claim
+from app.database import AsyncSessionLocal, SessionLocal
+from app.events import changes_mark, discard_since
+from app.models import SortlyWebhookEvent
+
+logger = logging.getLogger(__name__)
+
+WEBHOOK_BATCH_SIZE = int(os.getenv("WEBHOOK_BATCH_SIZE", "100"))
+WEBHOOK_POLL_INTERVAL = float(os.getenv("WEBHOOK_POLL_INTERVAL", "1.0"))
+# Claims older than this are assumed to belong to a crashed worker
+WEBHOOK_CLAIM_TIMEOUT = timedelta(seconds=int(os.getenv("WEBHOOK_CLAIM_TIMEOUT", "300")))
+# Keep processed rows this long so late Sortly retries are still recognised
+WEBHOOK_RETENTION = timedelta(days=int(os.getenv("WEBHOOK_RETENTION_DAYS", "7")))
+
+_queue = ClaimQueue("webhook")
+
+
+async def enqueue(idempotency_key: str, payload: str) -> bool:
+    """Persist one raw event. Returns False if the key was already seen."""
+    async with AsyncSessionLocal() as db:
+        db.add(SortlyWebhookEvent(idempotency_key=idempotency_key, payload=payload))
+        try:
+            await db.commit()
+        except IntegrityError:
+            await db.rollback()
+            return False
+    notify()
+    return True
+
+
+def notify():
+    """Wake the worker early (safe to call from any thread)."""
+    _queue.notify()
+
+
+def _claim(db, worker_id: str) -> list:
+    pending = (SortlyWebhookEvent.status == "pending",)
+    if not claim(db, SortlyWebhookEvent, SortlyWebhookEvent.id, pending, SortlyWebhookEvent.id,
+                 WEBHOOK_BATCH_SIZE, worker_id, status="processing"):
+        return []
+    return (
+        db.query(SortlyWebhookEvent)
+        .filter(
+            SortlyWebhookEvent.claimed_by == worker_id,
+            SortlyWebhookEvent.status == "processing",
+        )
+        .order_by(SortlyWebhookEvent.id)
+        .all()
+    )
+
+
+def drain_batch(handler) -> int:
+    """
+    Claim up to WEBHOOK_BATCH_SIZE pending events and apply them with
+    `handler(db, data) -> dict` in one transaction. Each event runs in a
+    savepoint so one bad payload doesn't undo the rest of the batch.
+    """
+    worker_id = uuid.uuid4().hex
+    db = SessionLocal()
+    try:
+        events = _claim(db, worker_id)
+        for event in events:
+            mark = changes_mark(db)
+            try:
+                with db.begin_nested():
+                    result = handler(db, json.loads(event.payload))
+                status = result.get("status", "done")
+            except Exception as e:
+                discard_since(db, mark)
+                result = {"status": "error", "message": str(e)}
+                status = "error"
+            event.status = status
+            event.result = json.dumps(result, default=str)
+            event.processed_at = datetime.utcnow()
+        db.commit()
+        return len(events)
+    finally:
+        db.close()
+
+
+def recover_stale_claims():
+    """Put events claimed by a worker that died mid-batch back in the queue."""
+    db = SessionLocal()
+    try:
+        db.execute(
+            update(SortlyWebhookEvent)
+            .where(
+                SortlyWebhookEvent.status == "processing",
+                SortlyWebhookEvent.claimed_at < datetime.utcnow() - WEBHOOK_CLAIM_TIMEOUT,
+            )
+            .values(status="pending", claimed_by=None, claimed_at=None)
+        )
+        db.commit()
+    finally:
+        db.close()
+
+
+def prune_processed():
+    db = SessionLocal()
+    try:
+        db.execute(
+            delete(SortlyWebhookEvent).where(
+                SortlyWebhookEvent.status != "pending",
+                SortlyWebhookEvent.status != "processing",
+                SortlyWebhookEvent.processed_at < datetime.utcnow() - WEBHOOK_RETENTION,
+            )
+        )
+        db.commit()
+    finally:
+        db.close()
+
+
+async def queue_stats() -> dict:
+    """Event counts by status."""
+    async with AsyncSessionLocal() as db:
+        rows = await db.execute(
+            select(SortlyWebhookEvent.status, func.count(SortlyWebhookEvent.id))
+            .group_by(SortlyWebhookEvent.status)
+        )
+        return dict(rows.all())
+
+
+async def run_worker(handler):
+    """Drain the queue until cancelled; DB work runs off the event loop."""
+    last_prune = None
+
+    def prune_hourly():
+        nonlocal last_prune
+        if last_prune is None or datetime.utcnow() - last_prune > timedelta(hours=1):
+            prune_processed()
+            last_prune = datetime.utcnow()
+
+    await asyncio.to_thread(recover_stale_claims)
+    await _queue.run(lambda: drain_batch(handler), WEBHOOK_BATCH_SIZE, WEBHOOK_POLL_INTERVAL, idle=prune_hourly)
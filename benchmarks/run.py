@@ -0,0 +1,365 @@
+"""
+Hot-path benchmarks for the scan, webhook and Sortly sync paths.
+
+    python -m benchmarks.run                          # throwaway SQLite file
+    python -m benchmarks.run --database-url postgresql://user:pw@localhost/bench
+    python -m benchmarks.run --quick --compare benchmarks/results/<previous>.json
+
+Everything runs in-process through FastAPI's TestClient against the real
+routes and database. Sortly itself is replaced by an in-memory catalog so
+sync timings measure our code, not the network. Results are written as
+JSON (default: benchmarks/results/<timestamp>.json).
+
+Point --database-url at a scratch database: its tables are dropped and
+recreated.
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), "results")
+
+
+def summarize(latencies_s, ops=None):
+    """Latency percentiles (ms) and throughput for a list of per-op timings."""
+    ordered = sorted(latencies_s)
+    total = sum(ordered)
+
+    def pct(p):
+        return round(ordered[min(len(ordered) - 1, int(p * len(ordered)))] * 1000, 3)
+
+    return {
+        "ops": ops or len(ordered),
+        "mean_ms": round(statistics.fmean(ordered) * 1000, 3),
+        "p50_ms": pct(0.50),
+        "p95_ms": pct(0.95),
+        "p99_ms": pct(0.99),
+        "ops_per_sec": round((ops or len(ordered)) / total, 1) if total else None,
+    }
+
+
+class FakeSortly:
+    """In-memory stand-in for GET /items (page/per_page) and GET /locations."""
+
+    class Response:
+        def __init__(self, body):
+            self.status_code = 200
+            self._body = body
+            self.text = ""
+
+        def json(self):
+            return self._body
+
+    def __init__(self, size):
+        self.size = size
+        self.location = "Warehouse"
+        self.stamp = datetime(2026, 1, 1)
+
+    def move_all(self, location):
+        self.location = location
+        self.stamp += timedelta(hours=1)
+
+    def get(self, path, params=None, **kwargs):
+        if path == "/locations":
+            names = ["Warehouse", "Truck", "Job Site"]
+            return self.Response({"data": [{"id": i, "name": n} for i, n in enumerate(names, 1)], "meta": {}})
+        page = int(params.get("page", 1))
+        per_page = int(params.get("per_page", 100))
+        start = (page - 1) * per_page
+        data = [
+            {
+                "id": i,
+                "name": f"SKU-{i % 500}-{i}",
+                "type": "item",
+                "parent": {"name": self.location},
+                "updated_at": (self.stamp + timedelta(seconds=i)).isoformat() + "Z",
+            }
+            for i in range(start + 1, min(start + per_page, self.size) + 1)
+        ]
+        return self.Response({"data": data, "meta": {}})
+
+
+def warm_location_tree():
+    """Load the location tree from FakeSortly once so no run reaches the real API."""
+    from app import sortly_client
+    from app.locations import location_tree
+
+    original_get = sortly_client.get
+    sortly_client.get = FakeSortly(0).get
+    try:
+        location_tree.refresh()
+    finally:
+        sortly_client.get = original_get
+
+
+def reset_db():
+    from app.database import Base, engine
+    from app.migrations import run_migrations
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    run_migrations(engine)
+
+
+def make_job(client, name, item_count, qty):
+    items = [{"name": f"SKU-{i}", "count": qty} for i in range(item_count)]
+    res = client.post("/job", json={"name": name, "items": items})
+    res.raise_for_status()
+    return res.json()["id"]
+
+
+def bench_scan(client, job_sizes, scans):
+    results = {}
+    for size in job_sizes:
+        reset_db()
+        job_id = make_job(client, f"scan-{size}", size, scans)
+        names = [f"SKU-{random.randrange(size)}" for _ in range(scans)]
+
+        latencies = []
+        for name in names:
+            start = time.perf_counter()
+            client.post(f"/scan/{job_id}", json={"barcode": name}).raise_for_status()
+            latencies.append(time.perf_counter() - start)
+
+        batch = [{"barcode": n, "count": 1} for n in names[:200]]
+        start = time.perf_counter()
+        client.post(f"/scan/{job_id}/batch", json={"scans": batch}).raise_for_status()
+        batch_s = time.perf_counter() - start
+
+        results[str(size)] = {
+            "single": summarize(latencies),
+            "batch_200": {"ms": round(batch_s * 1000, 3), "scans_per_sec": round(len(batch) / batch_s, 1)},
+        }
+    return results
+
+
+def bench_webhook(client, events):
+    from app import webhook_queue
+    from app.routes.sortly_webhook import apply_webhook_event
+
+    reset_db()
+    make_job(client, "webhook", 100, events)
+    payloads = [
+        json.dumps({
+            "type": "sortly.company.transaction.created",
+            "body": {
+                "id": n,
+                "verb": "move",
+                "node_type": "item",
+                "node_name": f"SKU-{n % 100}",
+                "old_parent_name": "Warehouse",
+                "node_parent_name": "Truck",
+                "moved_quantity": 1,
+            },
+        })
+        for n in range(events)
+    ]
+
+    latencies = []
+    for payload in payloads:
+        start = time.perf_counter()
+        client.post("/sortly/webhook", content=payload).raise_for_status()
+        latencies.append(time.perf_counter() - start)
+    # Redelivery of an already-seen event
+    dup_start = time.perf_counter()
+    client.post("/sortly/webhook", content=payloads[0]).raise_for_status()
+    duplicate_ms = (time.perf_counter() - dup_start) * 1000
+
+    start = time.perf_counter()
+    applied = 0
+    with contextlib.redirect_stdout(io.StringIO()):
+        while True:
+            n = webhook_queue.drain_batch(apply_webhook_event)
+            if not n:
+                break
+            applied += n
+    apply_s = time.perf_counter() - start
+
+    return {
+        "ack": summarize(latencies),
+        "duplicate_ack_ms": round(duplicate_ms, 3),
+        "apply": {"events": applied, "seconds": round(apply_s, 3),
+                  "events_per_sec": round(applied / apply_s, 1) if apply_s else None},
+    }
+
+
+def bench_sync(client, sizes):
+    from app import sortly_client
+
+    results = {}
+    original_get = sortly_client.get
+    try:
+        for size in sizes:
+            reset_db()
+            make_job(client, "sync", 500, size)
+            fake = FakeSortly(size)
+            sortly_client.get = fake.get
+            params = {"max_items": size, "max_pages": size // 100 + 1}
+
+            with contextlib.redirect_stdout(io.StringIO()):
+                start = time.perf_counter()
+                client.get("/sortly/sync", params=params).raise_for_status()
+                cold_s = time.perf_counter() - start
+
+                start = time.perf_counter()
+                client.get("/sortly/sync", params=params).raise_for_status()
+                unchanged_s = time.perf_counter() - start
+
+                fake.move_all("Truck")
+                start = time.perf_counter()
+                body = client.get("/sortly/sync", params=params).json()
+                moved_s = time.perf_counter() - start
+
+            results[str(size)] = {
+                "cold_ms": round(cold_s * 1000, 3),
+                "unchanged_ms": round(unchanged_s * 1000, 3),
+                "all_moved_ms": round(moved_s * 1000, 3),
+                "exits": body.get("exits"),
+            }
+    finally:
+        sortly_client.get = original_get
+    return results
+
+
+def bench_matching(sku_counts, queries):
+    from app.utils import SkuMatcher, fuzzy_match
+
+    class Item:
+        def __init__(self, name):
+            self.name = name
+
+    results = {}
+    for count in sku_counts:
+        items = [Item(f"SKU-{i}-{random.choice(['red', 'blue', 'green'])}") for i in range(count)]
+        # Half prefix hits (scanned serials), half fuzzy lookups
+        names = [
+            f"{random.choice(items).name}-{random.randrange(10**6)}" if n % 2 else f"sku {random.randrange(count)}"
+            for n in range(queries)
+        ]
+
+        latencies = []
+        for name in names:
+            start = time.perf_counter()
+            fuzzy_match(name, items)
+            latencies.append(time.perf_counter() - start)
+
+        matcher = SkuMatcher([i.name for i in items])
+        start = time.perf_counter()
+        matcher.match_many(names)
+        batch_s = time.perf_counter() - start
+
+        results[str(count)] = {
+            "fuzzy_match": summarize(latencies),
+            "match_many_total_ms": round(batch_s * 1000, 3),
+            "match_many_per_name_us": round(batch_s / len(names) * 1e6, 3),
+        }
+    return results
+
+
+def compare(current, previous, path=""):
+    """Print timing metrics that moved more than 10% between two result files."""
+    for key, value in current.items():
+        where = f"{path}.{key}" if path else key
+        old = previous.get(key) if isinstance(previous, dict) else None
+        if isinstance(value, dict):
+            compare(value, old or {}, where)
+        elif isinstance(value, (int, float)) and isinstance(old, (int, float)) and old:
+            change = (value - old) / old
+            if abs(change) >= 0.10 and (key.endswith("_ms") or key.endswith("_us") or "per_sec" in key):
+                worse = change < 0 if "per_sec" in key else change > 0
+                print(f"{'REGRESSION' if worse else 'improved  '} {where}: {old} -> {value} ({change:+.0%})")
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True).strip()
+    except Exception:
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", help="Scratch database (default: temporary SQLite file)")
+    parser.add_argument("--output", help="Result JSON path")
+    parser.add_argument("--compare", help="Previous result JSON to diff against")
+    parser.add_argument("--quick", action="store_true", help="Smaller sizes for a fast smoke run")
+    parser.add_argument("--only", choices=["scan", "webhook", "sync", "matching"], action="append")
+    parser.add_argument("--seed", type=int, default=1234)
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    tmpdir = None
+    if not args.database_url:
+        tmpdir = tempfile.mkdtemp(prefix="sortly-bench-")
+        args.database_url = f"sqlite:///{os.path.join(tmpdir, 'bench.db')}"
+
+    # The app reads its settings at import time
+    os.environ["DATABASE_URL"] = args.database_url
+    os.environ.setdefault("SORTLY_SECRET_KEY", "benchmark")
+    os.environ["SORTLY_SYNC_INTERVAL"] = "0"
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+    os.environ.setdefault("LOCATION_TREE_TTL_SECONDS", "86400")
+
+    from fastapi.testclient import TestClient
+    import main as app_main
+
+    client = TestClient(app_main.app)
+    warm_location_tree()
+    sizes = {
+        "job_sizes": [10, 100] if args.quick else [10, 100, 1000],
+        "scans": 100 if args.quick else 500,
+        "webhook_events": 200 if args.quick else 2000,
+        "sync_sizes": [100, 1000] if args.quick else [100, 1000, 10000],
+        "sku_counts": [10, 100] if args.quick else [10, 100, 1000, 5000],
+        "match_queries": 100 if args.quick else 500,
+    }
+    selected = set(args.only or ["scan", "webhook", "sync", "matching"])
+
+    benchmarks = {}
+    if "scan" in selected:
+        benchmarks["process_scan"] = bench_scan(client, sizes["job_sizes"], sizes["scans"])
+    if "webhook" in selected:
+        benchmarks["webhook"] = bench_webhook(client, sizes["webhook_events"])
+    if "sync" in selected:
+        benchmarks["sync"] = bench_sync(client, sizes["sync_sizes"])
+    if "matching" in selected:
+        benchmarks["matching"] = bench_matching(sizes["sku_counts"], sizes["match_queries"])
+
+    from app.database import engine
+    result = {
+        "meta": {
+            "timestamp": datetime.utcnow().isoformat() + "Z",
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "database": engine.dialect.name,
+            "quick": args.quick,
+            "sizes": sizes,
+        },
+        "benchmarks": benchmarks,
+    }
+
+    output = args.output or os.path.join(
+        RESULTS_DIR, datetime.utcnow().strftime("%Y%m%dT%H%M%SZ") + ".json"
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(result, f, indent=2)
+    print(f"Wrote {output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(result["benchmarks"], json.load(f).get("benchmarks", {}))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
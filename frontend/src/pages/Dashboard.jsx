@@ -10,7 +10,7 @@ export default function Dashboard() {
   // Fetch jobs from backend
   const fetchJobs = async () => {
     try {
-      const res = await api.get('/job/list/all')
+      const res = await api.get('/job/list/all', { params: { active: true } })
       setJobs(res.data)
     } catch (err) {
       console.error('Error loading jobs', err)
@@ -18,36 +18,66 @@ export default function Dashboard() {
     }
   }
 
-  // Auto sync every 30s
+  // The backend syncs with Sortly on its own schedule; we only read its status
   useEffect(() => {
-    if (!jobs?.length) return
-
-    const interval = setInterval(async () => {
+    const fetchSyncStatus = async () => {
       try {
-        setSyncing(true)
-        setError(null)
-
-        for (const job of jobs) {
-          await api.get(`/sortly/sync/${job.id}`)
-          console.log(`✅ Synced Sortly updates for ${job.name}`)
-        }
-
-        await fetchJobs()
-        setLastSync(new Date().toLocaleTimeString())
+        const res = await api.get('/sortly/sync/status')
+        const { running, last_run: lastRun, last_success_at: lastSuccess } = res.data
+        setSyncing(running)
+        setLastSync(lastSuccess ? new Date(`${lastSuccess}Z`).toLocaleTimeString() : null)
+        setError(lastRun?.error ? 'Error syncing with Sortly' : null)
       } catch (err) {
-        console.error('❌ Error syncing with Sortly', err)
-        setError('Error syncing with Sortly')
-      } finally {
-        setSyncing(false)
+        console.error('❌ Error reading Sortly sync status', err)
+        setError('Error reading Sortly sync status')
       }
-    }, 30000)
+    }
 
+    fetchSyncStatus()
+    const interval = setInterval(fetchSyncStatus, 30000)
     return () => clearInterval(interval)
-  }, [jobs])
+  }, [])
 
-  // Load jobs on mount
+  // Load jobs on mount, then slowly re-read them: the event stream only carries
+  // changes made by the backend process this client is connected to
   useEffect(() => {
     fetchJobs()
+    const interval = setInterval(fetchJobs, 60000)
+    return () => clearInterval(interval)
+  }, [])
+
+  // Live quantity updates pushed by the backend
+  useEffect(() => {
+    const source = new EventSource(`${api.defaults.baseURL}/job/stream`)
+
+    source.addEventListener('qty', (e) => {
+      const { job_id, items } = JSON.parse(e.data)
+      const qtyByName = Object.fromEntries(items.map((i) => [i.name, i.current_qty]))
+      setJobs((prev) =>
+        prev.map((job) =>
+          job.id !== job_id
+            ? job
+            : {
+                ...job,
+                items: job.items.map((item) =>
+                  item.name in qtyByName
+                    ? { ...item, current_qty: qtyByName[item.name] }
+                    : item
+                ),
+              }
+        )
+      )
+    })
+
+    // Structural changes: just refetch the list
+    for (const type of ['job_created', 'job_updated', 'job_deleted']) {
+      source.addEventListener(type, () => fetchJobs())
+    }
+
+    // Catch up on anything missed while (re)connecting
+    source.onopen = () => fetchJobs()
+
+    return () => source.close()
   }, [])
 
   return (
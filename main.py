@@ -1,16 +1,53 @@
+import time
+_boot_started = time.perf_counter()
+
 from dotenv import load_dotenv
 load_dotenv()
 
+import asyncio
+from contextlib import asynccontextmanager
+
+from app.startup import boot
+boot.start(_boot_started)
+boot.mark("dotenv")
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+boot.mark("import fastapi")
+
+from app import logs, metrics, sortly_writeback, sync_worker, webhook_queue
+from app.database import async_engine, engine
+from app.migrations import ensure_schema
+boot.mark("import app")
+from app.routes import jobs, metrics as metrics_routes, scans, sortly_sync, sortly_webhook
+boot.mark("import routes")
+
+logs.configure()
+metrics.instrument_engine(engine)
+metrics.instrument_engine(async_engine.sync_engine)
 
-from app.database import Base, engine
-from app.routes import jobs, scans, sortly_sync, sortly_webhook
+# One SELECT on the schema_version row; full create_all/migrations only if it's behind
+boot.mark("schema migrated" if ensure_schema(engine) else "schema check")
 
-# Create tables (no-op if they already exist)
-Base.metadata.create_all(bind=engine)
 
-app = FastAPI(title="Sortly MVP Backend")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Background workers live for the life of the process
+    tasks = [
+        asyncio.create_task(webhook_queue.run_worker(sortly_webhook.apply_webhook_event)),
+        asyncio.create_task(sync_worker.run_worker(sortly_sync.run_full_sync)),
+        asyncio.create_task(sortly_writeback.run_worker()),
+    ]
+    boot.finish()
+    yield
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    await async_engine.dispose()
+    logs.shutdown()
+
+
+app = FastAPI(title="Sortly MVP Backend", lifespan=lifespan)
 
 # ✅ Allowed origins — NO trailing slashes
 ALLOWED_ORIGINS = [
@@ -29,13 +66,17 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["OPTIONS", "GET", "POST", "PUT", "DELETE"],
     allow_headers=["*"],
+    expose_headers=["X-Next-After-Id", "X-Next-Before-Id"],  # pagination cursors
 )
+# Outermost, so latency includes CORS handling
+app.add_middleware(metrics.MetricsMiddleware)
 
 # Routers
 app.include_router(jobs.router)
 app.include_router(scans.router)
 app.include_router(sortly_sync.router)
 app.include_router(sortly_webhook.router)
+app.include_router(metrics_routes.router)
 
 @app.get("/")
 def root():
@@ -45,3 +86,6 @@ def root():
 @app.options("/jobs")
 def options_jobs():
     return {"ok": True}
+
+
+boot.mark("app setup")
@@ -0,0 +1,261 @@
+"""
+Local stand-in for the Sortly API, for load tests and offline development.
+
+    python -m tools.fake_sortly --port 8900 --items 5000 --latency-ms 80 --rate-limit 10
+    SORTLY_BASE_URL=http://127.0.0.1:8900/api/v1 uvicorn main:app --port 8001
+
+Serves, from a seeded in-memory catalog:
+    GET  /api/v1/items           updated_since, page, per_page, filter[name], filter[location_id]
+    GET  /api/v1/items/{id}
+    PUT  /api/v1/items/{id}      {"quantity": n} and/or {"parent_id": location_id}
+    GET  /api/v1/locations
+Test controls (not part of Sortly):
+    POST /_fake/move             {"count": 10, "to": "Truck"} moves random items and
+                                 optionally posts transaction.created webhooks (--webhook-url)
+    GET  /_fake/stats            request / 429 / injected-error counters
+"""
+import argparse
+import asyncio
+import json
+import random
+import threading
+import time
+from datetime import datetime, timezone
+
+import requests
+import uvicorn
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import JSONResponse
+
+API = "/api/v1"
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.%fZ")
+
+
+def _parse_time(value: str) -> datetime:
+    parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+
+
+class Catalog:
+    def __init__(self, items: int, seed: int, catalog_path: str | None = None):
+        rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.locations = {
+            1: {"id": 1, "name": "Warehouse", "type": "folder", "parent_id": None},
+            2: {"id": 2, "name": "Truck", "type": "folder", "parent_id": None},
+            3: {"id": 3, "name": "Job Site", "type": "folder", "parent_id": None},
+            4: {"id": 4, "name": "Shelf A", "type": "folder", "parent_id": 1},
+        }
+        if catalog_path:
+            with open(catalog_path) as f:
+                seeded = json.load(f)
+        else:
+            colors = ["blue", "red", "green", "black", "white"]
+            seeded = [
+                {
+                    "id": 1000 + i,
+                    "name": f"HF-{colors[i % len(colors)]}-{i}",
+                    "sku": f"HF-{colors[i % len(colors)]}",
+                    "quantity": rng.randint(1, 50),
+                    "parent_id": rng.choice([1, 1, 1, 4]),
+                }
+                for i in range(items)
+            ]
+        stamp = _now()
+        self.items = {}
+        for item in seeded:
+            item = {"type": "item", "updated_at": stamp, **item}
+            self.items[item["id"]] = item
+
+    def render(self, item: dict) -> dict:
+        parent = self.locations.get(item.get("parent_id"))
+        return {**item, "parent": {"id": parent["id"], "name": parent["name"]} if parent else None}
+
+    def touch(self, item: dict):
+        item["updated_at"] = _now()
+
+    def location_by_name(self, name: str):
+        return next((l for l in self.locations.values() if l["name"].lower() == name.lower()), None)
+
+
+class Chaos:
+    """Latency, token-bucket rate limiting (429) and random 5xx injection."""
+
+    def __init__(self, latency_ms, jitter_ms, rate_limit, burst, error_rate):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.rate_limit = rate_limit
+        self.burst = burst or max(1, int(rate_limit or 1))
+        self.error_rate = error_rate
+        self.tokens = float(self.burst)
+        self.refilled = time.monotonic()
+        self.lock = threading.Lock()
+        self.stats = {"requests": 0, "rate_limited": 0, "injected_errors": 0}
+
+    def allow(self) -> bool:
+        if not self.rate_limit:
+            return True
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.refilled) * self.rate_limit)
+            self.refilled = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return True
+            return False
+
+
+def create_app(catalog: Catalog, chaos: Chaos, webhook_url: str | None = None,
+               newest_first: bool = False) -> FastAPI:
+    app = FastAPI(title="Fake Sortly")
+
+    @app.middleware("http")
+    async def inject_chaos(request: Request, call_next):
+        if not request.url.path.startswith(API):
+            return await call_next(request)
+        chaos.stats["requests"] += 1
+        if chaos.latency_ms or chaos.jitter_ms:
+            await asyncio.sleep((chaos.latency_ms + random.uniform(0, chaos.jitter_ms)) / 1000)
+        if not chaos.allow():
+            chaos.stats["rate_limited"] += 1
+            retry_after = max(1, int(1 / chaos.rate_limit))
+            return JSONResponse({"error": "rate limited"}, status_code=429,
+                                headers={"Retry-After": str(retry_after)})
+        if chaos.error_rate and random.random() < chaos.error_rate:
+            chaos.stats["injected_errors"] += 1
+            return JSONResponse({"error": "injected failure"}, status_code=random.choice([500, 502, 503]))
+        return await call_next(request)
+
+    @app.get(f"{API}/items")
+    def list_items(request: Request, page: int = 1, per_page: int = 100, updated_since: str | None = None):
+        q = request.query_params
+        name = (q.get("filter[name]") or "").lower()
+        location_id = q.get("filter[location_id]")
+        per_page = max(1, min(per_page, 100))
+        with catalog.lock:
+            items = sorted(catalog.items.values(), key=lambda i: (i["updated_at"], i["id"]),
+                           reverse=newest_first)
+            if updated_since:
+                try:
+                    since = _parse_time(updated_since)
+                except ValueError:
+                    raise HTTPException(status_code=422, detail="Invalid updated_since")
+                items = [i for i in items if _parse_time(i["updated_at"]) >= since]
+            if name:
+                items = [i for i in items if name in i["name"].lower()]
+            if location_id:
+                items = [i for i in items if str(i.get("parent_id")) == location_id]
+            start = (page - 1) * per_page
+            data = [catalog.render(i) for i in items[start:start + per_page]]
+        has_more = start + per_page < len(items)
+        return {"data": data, "meta": {"total_count": len(items), "next_page": page + 1 if has_more else None}}
+
+    @app.get(f"{API}/items/{{item_id}}")
+    def get_item(item_id: int):
+        with catalog.lock:
+            item = catalog.items.get(item_id)
+            if not item:
+                raise HTTPException(status_code=404, detail="Item not found")
+            return {"data": catalog.render(item)}
+
+    @app.put(f"{API}/items/{{item_id}}")
+    def update_item(item_id: int, payload: dict):
+        with catalog.lock:
+            item = catalog.items.get(item_id)
+            if not item:
+                raise HTTPException(status_code=404, detail="Item not found")
+            if "quantity" in payload:
+                item["quantity"] = payload["quantity"]
+            if "parent_id" in payload:
+                if payload["parent_id"] not in catalog.locations:
+                    raise HTTPException(status_code=422, detail="Unknown parent_id")
+                item["parent_id"] = payload["parent_id"]
+            catalog.touch(item)
+            return {"data": catalog.render(item)}
+
+    @app.get(f"{API}/locations")
+    def list_locations():
+        return {"data": list(catalog.locations.values())}
+
+    @app.post("/_fake/move")
+    def move_items(payload: dict):
+        """Move random items to a location, as a person would in the Sortly app."""
+        count = int(payload.get("count", 1))
+        target = catalog.location_by_name(payload.get("to", "Truck"))
+        if not target:
+            raise HTTPException(status_code=404, detail="Unknown location")
+        events = []
+        with catalog.lock:
+            for item in random.sample(list(catalog.items.values()), min(count, len(catalog.items))):
+                old = catalog.locations.get(item.get("parent_id"))
+                item["parent_id"] = target["id"]
+                catalog.touch(item)
+                events.append(transaction_event(item, old["name"] if old else None, target["name"]))
+        if webhook_url:
+            threading.Thread(target=post_webhooks, args=(webhook_url, events), daemon=True).start()
+        return {"moved": len(events), "events": events if payload.get("return_events") else None}
+
+    @app.get("/_fake/stats")
+    def stats():
+        return {**chaos.stats, "items": len(catalog.items)}
+
+    return app
+
+
+_txn_counter = iter(range(1, 10**12))
+
+
+def transaction_event(item: dict, old_location: str | None, new_location: str) -> dict:
+    """A Sortly-shaped transaction.created webhook payload for one move."""
+    return {
+        "type": "sortly.company.transaction.created",
+        "time": _now(),
+        "body": {
+            "id": next(_txn_counter),
+            "verb": "move",
+            "node_type": "item",
+            "node_id": item["id"],
+            "node_name": item["name"],
+            "old_parent_name": old_location,
+            "node_parent_name": new_location,
+            "moved_quantity": item.get("quantity", 1),
+        },
+    }
+
+
+def post_webhooks(url: str, events: list):
+    with requests.Session() as session:
+        for event in events:
+            try:
+                session.post(url, json=event, timeout=10)
+            except requests.RequestException as e:
+                print(f"❌ Webhook delivery failed: {e}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8900)
+    parser.add_argument("--items", type=int, default=1000, help="Generated catalog size")
+    parser.add_argument("--catalog", help="JSON list of items to serve instead of a generated catalog")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--jitter-ms", type=float, default=0.0)
+    parser.add_argument("--rate-limit", type=float, default=0.0, help="Requests/sec before 429s (0 = off)")
+    parser.add_argument("--burst", type=int, default=0, help="Token bucket size (default: one second of rate)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests failing with 5xx")
+    parser.add_argument("--webhook-url", help="Deliver move webhooks here, e.g. http://127.0.0.1:8001/sortly/webhook")
+    parser.add_argument("--newest-first", action="store_true",
+                        help="List /items newest first (not in updated_at order)")
+    args = parser.parse_args()
+
+    catalog = Catalog(args.items, args.seed, args.catalog)
+    chaos = Chaos(args.latency_ms, args.jitter_ms, args.rate_limit, args.burst, args.error_rate)
+    uvicorn.run(create_app(catalog, chaos, args.webhook_url, args.newest_first), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
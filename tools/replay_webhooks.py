@@ -0,0 +1,176 @@
+"""
+Fire recorded Sortly transaction.created payloads at /sortly/webhook at a
+target rate and report throughput, latency and backpressure.
+
+    python -m tools.replay_webhooks recorded.ndjson --rate 200 --duration 30
+    python -m tools.replay_webhooks --generate 500 --items "HF-blue-1,HF-red-2" --rate 50
+
+Input is NDJSON (one payload per line) or a JSON list. Payloads are cycled
+until --count or --duration is reached; --unique-ids rewrites body.id on each
+send so repeats aren't deduplicated by the inbox. Requests are scheduled on
+a fixed clock, so when the server falls behind the report shows it as send
+lag and rising latency instead of a silently lower rate.
+"""
+import argparse
+import itertools
+import json
+import statistics
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+import requests
+from requests.adapters import HTTPAdapter
+
+
+def load_payloads(path: str) -> list:
+    with open(path) as f:
+        text = f.read().strip()
+    if text.startswith("["):
+        payloads = json.loads(text)
+    else:
+        payloads = [json.loads(line) for line in text.splitlines() if line.strip()]
+    return [p for p in payloads if isinstance(p, dict)]
+
+
+def generate_payloads(count: int, items: list, warehouse: str, elsewhere: str) -> list:
+    """Synthetic moves alternating out of and back into the warehouse."""
+    payloads = []
+    for i in range(count):
+        out = i % 2 == 0
+        payloads.append({
+            "type": "sortly.company.transaction.created",
+            "time": datetime.now(timezone.utc).isoformat(),
+            "body": {
+                "id": i + 1,
+                "verb": "move",
+                "node_type": "item",
+                "node_name": items[i % len(items)],
+                "old_parent_name": warehouse if out else elsewhere,
+                "node_parent_name": elsewhere if out else warehouse,
+                "moved_quantity": 1,
+            },
+        })
+    return payloads
+
+
+class Recorder:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = []
+        self.lags = []
+        self.statuses = {}
+
+    def add(self, status, latency_s, lag_s):
+        with self.lock:
+            self.latencies.append(latency_s)
+            self.lags.append(lag_s)
+            self.statuses[status] = self.statuses.get(status, 0) + 1
+
+
+def _pct(ordered, p):
+    return round(ordered[min(len(ordered) - 1, int(p * len(ordered)))] * 1000, 2) if ordered else None
+
+
+def replay(url, payloads, rate, count, duration, concurrency, unique_ids, timeout):
+    session = requests.Session()
+    session.mount("http://", HTTPAdapter(pool_connections=1, pool_maxsize=concurrency))
+    session.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=concurrency))
+    recorder = Recorder()
+    id_base = int(time.time() * 1000) * 1000
+
+    def send(seq, payload, due):
+        if unique_ids:
+            payload = {**payload, "body": {**(payload.get("body") or {}), "id": id_base + seq}}
+        start = time.perf_counter()
+        try:
+            status = session.post(url, json=payload, timeout=timeout).status_code
+        except requests.Timeout:
+            status = "timeout"
+        except requests.RequestException:
+            status = "connection_error"
+        recorder.add(status, time.perf_counter() - start, start - due)
+
+    interval = 1.0 / rate if rate else 0.0
+    started = time.perf_counter()
+    sent = 0
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for seq, payload in enumerate(itertools.cycle(payloads)):
+            if count and sent >= count:
+                break
+            due = started + seq * interval
+            if duration and due - started >= duration:
+                break
+            delay = due - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            pool.submit(send, seq, payload, due)
+            sent += 1
+    elapsed = time.perf_counter() - started
+
+    latencies = sorted(recorder.latencies)
+    lags = sorted(recorder.lags)
+    accepted = sum(n for s, n in recorder.statuses.items() if isinstance(s, int) and s < 300)
+    return {
+        "url": url,
+        "target_rate": rate,
+        "sent": sent,
+        "elapsed_s": round(elapsed, 3),
+        "achieved_rate": round(sent / elapsed, 2) if elapsed else None,
+        "accepted": accepted,
+        "statuses": {str(s): n for s, n in sorted(recorder.statuses.items(), key=str)},
+        "latency_ms": {
+            "p50": _pct(latencies, 0.50),
+            "p95": _pct(latencies, 0.95),
+            "p99": _pct(latencies, 0.99),
+            "max": round(latencies[-1] * 1000, 2) if latencies else None,
+            "mean": round(statistics.fmean(latencies) * 1000, 2) if latencies else None,
+        },
+        # How late requests left versus their schedule: > 0 means the
+        # server (or --concurrency) couldn't keep up with --rate
+        "send_lag_ms": {"p50": _pct(lags, 0.50), "p99": _pct(lags, 0.99)},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("payloads", nargs="?", help="NDJSON or JSON-list file of recorded webhook payloads")
+    parser.add_argument("--url", default="http://127.0.0.1:8001/sortly/webhook")
+    parser.add_argument("--rate", type=float, default=50.0, help="Target requests/sec (0 = as fast as possible)")
+    parser.add_argument("--count", type=int, default=0, help="Stop after N requests (default: one pass)")
+    parser.add_argument("--duration", type=float, default=0.0, help="Stop after N seconds")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--timeout", type=float, default=10.0)
+    parser.add_argument("--unique-ids", action="store_true", help="Give every send a fresh transaction id")
+    parser.add_argument("--generate", type=int, default=0, help="Synthesize N move events instead of reading a file")
+    parser.add_argument("--items", default="HF-blue-0", help="Comma-separated item names for --generate")
+    parser.add_argument("--warehouse", default="Warehouse")
+    parser.add_argument("--elsewhere", default="Truck")
+    parser.add_argument("--output", help="Also write the JSON report here")
+    args = parser.parse_args()
+
+    if args.generate:
+        items = [x.strip() for x in args.items.split(",") if x.strip()]
+        payloads = generate_payloads(args.generate, items, args.warehouse, args.elsewhere)
+    elif args.payloads:
+        payloads = load_payloads(args.payloads)
+    else:
+        parser.error("give a payload file or --generate N")
+    if not payloads:
+        parser.error("no payloads to replay")
+
+    count = args.count or (0 if args.duration else len(payloads))
+    report = replay(args.url, payloads, args.rate, count, args.duration,
+                    args.concurrency, args.unique_ids, args.timeout)
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    return 0 if report["accepted"] == report["sent"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())